@@ -0,0 +1,93 @@
+"""In-memory stand-in for a ZKTeco MB20-VL.
+
+Implements the part of the pyzk ``ZK``/connection surface used by the
+collector (``connect``, ``disable_device``, ``get_attendance``,
+``get_users``, ``enable_device``, ``disconnect``) so the ingest stage can be
+benchmarked without a real terminal.
+"""
+import random
+import time
+from datetime import datetime, timedelta
+
+
+class FakeUser:
+    __slots__ = ("uid", "user_id", "name")
+
+    def __init__(self, uid, user_id, name):
+        self.uid = uid
+        self.user_id = user_id
+        self.name = name
+
+
+class FakeAttendance:
+    __slots__ = ("uid", "user_id", "timestamp", "status", "punch")
+
+    def __init__(self, uid, user_id, timestamp, status=1, punch=0):
+        self.uid = uid
+        self.user_id = user_id
+        self.timestamp = timestamp
+        self.status = status
+        self.punch = punch
+
+
+def generate_users(user_count):
+    return [FakeUser(i, str(i), f"EMP{i:05d}") for i in range(1, user_count + 1)]
+
+
+def generate_attendance(record_count, users, start=None, seed=0):
+    """Spread ``record_count`` punches over ``users`` with increasing timestamps."""
+    rng = random.Random(seed)
+    start = start or datetime(2025, 1, 1, 8, 0, 0)
+    records = []
+    clock = start
+    for i in range(record_count):
+        clock += timedelta(seconds=rng.randint(1, 30))
+        user = users[rng.randrange(len(users))]
+        records.append(FakeAttendance(i + 1, user.user_id, clock, punch=i % 2))
+    return records
+
+
+class FakeZK:
+    """Drop-in replacement for ``zk.ZK``; configure with :meth:`configure`."""
+
+    attendance = []
+    users = []
+    transfer_delay_per_record = 0.0
+    disabled_seconds = []
+
+    def __init__(self, ip=None, port=4370, password=0, force_udp=False, timeout=5, ommit_ping=False, **kwargs):
+        self.ip = ip
+        self.port = port
+        self._disabled_at = None
+
+    @classmethod
+    def configure(cls, record_count, user_count=200, transfer_delay_per_record=0.0, start=None, seed=0):
+        cls.users = generate_users(user_count)
+        cls.attendance = generate_attendance(record_count, cls.users, start=start, seed=seed)
+        cls.transfer_delay_per_record = transfer_delay_per_record
+        cls.disabled_seconds = []
+        return cls
+
+    def connect(self):
+        return self
+
+    def disable_device(self):
+        self._disabled_at = time.perf_counter()
+        return True
+
+    def enable_device(self):
+        if self._disabled_at is not None:
+            type(self).disabled_seconds.append(time.perf_counter() - self._disabled_at)
+            self._disabled_at = None
+        return True
+
+    def get_attendance(self):
+        if self.transfer_delay_per_record:
+            time.sleep(self.transfer_delay_per_record * len(self.attendance))
+        return list(self.attendance)
+
+    def get_users(self):
+        return list(self.users)
+
+    def disconnect(self):
+        return True
@@ -0,0 +1,252 @@
+"""End-to-end benchmark of the collection and sync pipeline.
+
+Runs every stage of ``run_all.py`` in-process against local stand-ins:
+
+* ``device_ingest`` - ``insert_log_to_db.main()`` (collect into the spool, then
+  drain) with ``zk.ZK`` replaced by :class:`fake_device.FakeZK`
+* ``zoho_import``   - ``zoholog_to_db.main()`` against :mod:`zoho_stub`
+* ``reconcile``     - ``order_table.main()``
+* ``sync``          - ``sync_to_zoho.main()`` against :mod:`zoho_stub`
+
+For each punch count it reports wall time, throughput and the latency
+distribution of the per-item call of every stage. The database is a
+dedicated MariaDB schema (default ``zk_attendance_bench``), or with
+``--backend sqlite`` a SQLite file in a temporary directory, truncated and
+re-seeded before each size.
+
+    python3 benchmarks/run_benchmarks.py --sizes 10000,100000,1000000
+    python3 benchmarks/run_benchmarks.py --sizes 10000 --latency 0.05 --rate-429 0.02 --json bench.json
+    python3 benchmarks/run_benchmarks.py --sizes 10000 --backend sqlite
+"""
+import argparse
+import functools
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [REPO_DIR, BENCH_DIR]
+
+from fake_device import FakeZK  # noqa: E402
+from seed_db import connect_mysql, connect_sqlite, create_schema, reset_tables, seed  # noqa: E402
+from zoho_stub import ZohoStubServer, ZohoStubState  # noqa: E402
+
+STAGES = ["device_ingest", "zoho_import", "reconcile", "sync"]
+# Upper bound of the gap between consecutive generated punches (fake_device.py, seed_db.py)
+MAX_PUNCH_GAP_SECONDS = 30
+
+
+# ===== MEASUREMENT HELPERS =====
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def timed(module, name, samples):
+    """Replace ``module.name`` with a wrapper that appends call durations to ``samples``."""
+    original = getattr(module, name)
+
+    @functools.wraps(original)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            samples.append(time.perf_counter() - started)
+
+    setattr(module, name, wrapper)
+    return original
+
+
+def run_stage(stage, items, func, per_item):
+    """Run ``func`` once and summarise it; ``per_item`` is a list of (module, function) to time."""
+    samples = []
+    originals = [(module, name, timed(module, name, samples)) for module, name in per_item]
+    started = time.perf_counter()
+    error = None
+    try:
+        func()
+    except Exception as e:  # a failing stage must not hide the others
+        error = repr(e)
+    elapsed = time.perf_counter() - started
+    for module, name, original in originals:
+        setattr(module, name, original)
+
+    return {
+        "stage": stage,
+        "items": items,
+        "seconds": round(elapsed, 3),
+        "throughput_per_s": round(items / elapsed, 1) if elapsed else 0.0,
+        "calls": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 99) * 1000, 3),
+        "error": error,
+    }
+
+
+# ===== ENVIRONMENT =====
+def prepare_environment(args, stub_url):
+    from dotenv import load_dotenv
+
+    load_dotenv(os.path.join(REPO_DIR, "e.env"))
+    os.environ["DB_NAME"] = args.database
+    work_dir = tempfile.mkdtemp(prefix="zk-bench-")
+    os.environ["DB_BACKEND"] = args.backend
+    os.environ["SQLITE_PATH"] = os.path.join(work_dir, "bench.sqlite3")
+    os.environ["SPOOL_FILE"] = os.path.join(work_dir, "device_spool.bin")
+    os.environ["DEVICE_LOCK_METRICS_FILE"] = os.path.join(work_dir, "device_lock_metrics.jsonl")
+    os.environ.setdefault("DEVICE_IP", "127.0.0.1")
+    os.environ.setdefault("DEVICE_PORT", "4370")
+    os.environ.setdefault("DEVICE_PASSWORD", "0")
+    os.environ["ZOHO_ACCOUNTS_URL"] = stub_url
+    os.environ["ZOHO_PEOPLE_URL"] = stub_url
+    os.environ.setdefault("ZOHO_CLIENT_ID", "bench")
+    os.environ.setdefault("ZOHO_CLIENT_SECRET", "bench")
+    os.environ.setdefault("ZOHO_REFRESH_TOKEN", "bench")
+
+
+def add_zoho_entries(state, attendance, ratio, seed=0):
+    """Mirror a fraction of device punches as Zoho entries within the 30 minute reconcile window."""
+    rng = random.Random(seed)
+    for record in attendance:
+        if rng.random() >= ratio:
+            continue
+        moment = record.timestamp + timedelta(minutes=rng.randint(-10, 10))
+        emp_id = f"EMP{int(record.user_id):05d}"
+        if rng.random() < 0.5:
+            state.add_att_entry(emp_id, check_in=moment)
+        else:
+            state.add_att_entry(emp_id, check_out=moment)
+
+
+def reset_spool(spool_path):
+    for suffix in ("", ".watermark.json", ".appended.json"):
+        if os.path.exists(spool_path + suffix):
+            os.remove(spool_path + suffix)
+
+
+def benchmark_size(size, args, state, modules):
+    insert_log_to_db, zoholog_to_db, order_table, sync_to_zoho = modules
+    reset_spool(os.environ["SPOOL_FILE"])
+
+    if args.backend == "sqlite":
+        conn = connect_sqlite(os.environ["SQLITE_PATH"])
+    else:
+        conn = connect_mysql(args.database)
+    # Punches are at most MAX_PUNCH_GAP_SECONDS apart; end the device data before now and the history before that,
+    # so the stages' recent-data windows see the fresh punches the way they would in production
+    device_start = datetime.now().replace(microsecond=0) - timedelta(seconds=size * MAX_PUNCH_GAP_SECONDS)
+    history_start = device_start - timedelta(seconds=args.history * MAX_PUNCH_GAP_SECONDS)
+    create_schema(conn, args.backend)
+    reset_tables(conn, args.backend)
+    seed(conn, args.backend, args.history, users=args.users, start=history_start, zoho_ratio=args.zoho_ratio)
+    conn.close()
+
+    FakeZK.configure(size, user_count=args.users, transfer_delay_per_record=args.transfer_delay, start=device_start)
+    insert_log_to_db.ZK = FakeZK
+    # Reconcile every fresh punch (and none of the seeded history), whatever the size
+    order_table.LOOKBACK_DAYS = (datetime.now() - device_start).days + 1
+    state.day_entries.clear()
+    state.pushes.clear()
+    state.requests.clear()
+    state.throttled.clear()
+    add_zoho_entries(state, FakeZK.attendance, args.zoho_ratio)
+    zoho_items = sum(len(v) for days in state.day_entries.values() for v in days.values())
+
+    plan = {
+        "device_ingest": (
+            size,
+            lambda: insert_log_to_db.main([]),
+            [(insert_log_to_db, "fetch_device_punches"), (insert_log_to_db, "drain_spool")],
+        ),
+        "zoho_import": (zoho_items, zoholog_to_db.main, [(zoholog_to_db, "ingest_day")]),
+        "reconcile": (size, order_table.main, [(order_table, "delete_device_log")]),
+        "sync": (size, sync_to_zoho.main, [(sync_to_zoho, "push_attendance")]),
+    }
+
+    results = []
+    for stage in args.stages:
+        items, func, per_item = plan[stage]
+        result = run_stage(stage, items, func, per_item)
+        result["size"] = size
+        if stage == "device_ingest":
+            result["device_disabled_s"] = round(sum(FakeZK.disabled_seconds), 3)
+        if stage == "sync":
+            result["http_429"] = sum(state.throttled.values())
+        results.append(result)
+        print(format_result(result), flush=True)
+    return results
+
+
+def format_result(r):
+    line = (
+        f"{r['size']:>9} {r['stage']:<14} {r['seconds']:>10.2f}s {r['throughput_per_s']:>12.1f}/s "
+        f"p50 {r['p50_ms']:>8.2f}ms p95 {r['p95_ms']:>8.2f}ms p99 {r['p99_ms']:>8.2f}ms"
+    )
+    if "device_disabled_s" in r:
+        line += f"  device disabled {r['device_disabled_s']:.2f}s"
+    if r.get("http_429"):
+        line += f"  429s {r['http_429']}"
+    if r["error"]:
+        line += f"  ERROR {r['error']}"
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ZKTeco -> Zoho pipeline against local stand-ins")
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="comma-separated punch counts")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"subset of {','.join(STAGES)}")
+    parser.add_argument("--backend", choices=["mysql", "sqlite"], default="mysql")
+    parser.add_argument("--database", default="zk_attendance_bench")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--history", type=int, default=0, help="rows of prior history to seed before each size")
+    parser.add_argument("--zoho-ratio", type=float, default=0.1, help="fraction of punches also present in Zoho")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every Zoho stub response")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="fraction of Zoho stub responses that are 429")
+    parser.add_argument("--transfer-delay", type=float, default=0.0, help="simulated device transfer seconds per record")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--verbose", action="store_true", help="keep the stages' INFO logging")
+    args = parser.parse_args()
+    args.stages = [s for s in args.stages.split(",") if s]
+    unknown = set(args.stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    state = ZohoStubState(
+        employees=[f"EMP{i:05d}" for i in range(1, args.users + 1)],
+        latency=args.latency,
+        rate_429=args.rate_429,
+    )
+    results = []
+    with ZohoStubServer(state) as server:
+        prepare_environment(args, server.url)
+        import insert_log_to_db
+        import order_table
+        import sync_to_zoho
+        import zoholog_to_db
+
+        modules = (insert_log_to_db, zoholog_to_db, order_table, sync_to_zoho)
+        print(f"{'size':>9} {'stage':<14} {'wall':>11} {'throughput':>14}")
+        for size in (int(s) for s in args.sizes.split(",") if s):
+            results.extend(benchmark_size(size, args, state, modules))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""Seed a benchmark database with synthetic attendance history.
+
+Creates the schema from ``schema.sql`` (MariaDB) or ``schema_sqlite.sql``
+(SQLite), then fills ``attendance_logs``, ``raw_device_logs``,
+``raw_zoho_logs`` and ``user_mapping`` with deterministic punches.
+
+    python3 benchmarks/seed_db.py --backend mysql --database zk_attendance_bench --punches 100000
+    python3 benchmarks/seed_db.py --backend sqlite --sqlite-path bench.sqlite3 --punches 100000
+
+The MariaDB target refuses database names without ``bench`` in them so a
+production ``zk_attendance`` is never truncated by accident.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEMA_FILE = os.path.join(REPO_DIR, "schema.sql")
+SQLITE_SCHEMA_FILE = os.path.join(REPO_DIR, "schema_sqlite.sql")
+TABLES = [
+    "attendance_logs", "raw_device_logs", "raw_zoho_logs", "user_mapping", "zoho_day_digests", "collector_leases",
+    "daily_attendance_summary",
+]
+BATCH_SIZE = 5000
+
+
+# ===== CONNECTIONS =====
+def connect_mysql(database, create=True):
+    import mysql.connector
+    from dotenv import load_dotenv
+
+    load_dotenv(os.path.join(REPO_DIR, "e.env"))
+    if "bench" not in database:
+        raise ValueError(f"Refusing to seed '{database}': benchmark database names must contain 'bench'")
+
+    config = {
+        "host": os.getenv("DB_HOST"),
+        "user": os.getenv("DB_USER"),
+        "password": os.getenv("DB_PASS"),
+    }
+    if create:
+        conn = mysql.connector.connect(**config)
+        cursor = conn.cursor()
+        cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{database}` CHARACTER SET utf8mb4")
+        cursor.close()
+        conn.close()
+    return mysql.connector.connect(database=database, **config)
+
+
+def connect_sqlite(path):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+# ===== SCHEMA =====
+def schema_statements():
+    with open(SCHEMA_FILE, encoding="utf-8") as f:
+        lines = [line for line in f if not line.lstrip().startswith("--")]
+    for statement in "".join(lines).split(";"):
+        statement = statement.strip()
+        upper = statement.upper()
+        if not statement or upper.startswith("CREATE DATABASE") or upper.startswith("USE "):
+            continue
+        yield statement
+
+
+def create_schema(conn, backend):
+    cursor = conn.cursor()
+    if backend == "sqlite":
+        with open(SQLITE_SCHEMA_FILE, encoding="utf-8") as f:
+            cursor.executescript(f.read())
+    else:
+        for statement in schema_statements():
+            cursor.execute(statement)
+    conn.commit()
+    cursor.close()
+
+
+def reset_tables(conn, backend):
+    cursor = conn.cursor()
+    for table in TABLES:
+        if backend == "sqlite":
+            cursor.execute(f"DELETE FROM {table}")
+        else:
+            cursor.execute(f"TRUNCATE TABLE `{table}`")
+    conn.commit()
+    cursor.close()
+
+
+# ===== DATA GENERATION =====
+def generate_history(punches, users, start, zoho_ratio, seed=0):
+    """Yield (table, row) pairs for ``punches`` device punches plus Zoho copies."""
+    rng = random.Random(seed)
+    last_status = {}
+    clock = start
+    for _ in range(punches):
+        clock += timedelta(seconds=rng.randint(1, 30))
+        user_id = rng.randint(1, users)
+        name = f"EMP{user_id:05d}"
+        status = "Check-Out" if last_status.get(user_id) == "Check-In" else "Check-In"
+        last_status[user_id] = status
+        punch_type = 0 if status == "Check-In" else 1
+
+        yield "raw_device_logs", (user_id, name, clock, status, "10.0.0.1")
+        if rng.random() < zoho_ratio:
+            zoho_time = clock + timedelta(minutes=rng.randint(-20, 20))
+            yield "raw_zoho_logs", (user_id, name, zoho_time, punch_type, "zoho")
+            yield "attendance_logs", (user_id, name, zoho_time, punch_type, 1, "zoho")
+        else:
+            yield "attendance_logs", (user_id, name, clock, punch_type, 1, "device")
+
+
+INSERTS = {
+    "attendance_logs": "INSERT INTO attendance_logs (user_id, name, timestamp, punch_type, synced, source) VALUES (%s, %s, %s, %s, %s, %s)",
+    "raw_device_logs": "INSERT INTO raw_device_logs (user_id, name, timestamp, status, device_ip) VALUES (%s, %s, %s, %s, %s)",
+    "raw_zoho_logs": "INSERT IGNORE INTO raw_zoho_logs (user_id, name, timestamp, punch_type, source) VALUES (%s, %s, %s, %s, %s)",
+    "user_mapping": "INSERT INTO user_mapping (zoho_emp_id, zk_user_id) VALUES (%s, %s)",
+}
+
+
+def _sql_for(backend, table):
+    sql = INSERTS[table]
+    if backend == "sqlite":
+        sql = sql.replace("INSERT IGNORE", "INSERT OR IGNORE").replace("%s", "?")
+    return sql
+
+
+def _flush(cursor, backend, table, rows):
+    if backend == "sqlite":
+        rows = [tuple(v.strftime("%Y-%m-%d %H:%M:%S") if isinstance(v, datetime) else v for v in row) for row in rows]
+    cursor.executemany(_sql_for(backend, table), rows)
+    return len(rows)
+
+
+def seed(conn, backend, punches, users=200, start=None, zoho_ratio=0.1, seed=0):
+    """Insert synthetic history; returns a dict of row counts per table."""
+    start = start or datetime(2024, 1, 1, 8, 0, 0)
+    cursor = conn.cursor()
+    counts = {table: 0 for table in TABLES}
+
+    mapping = [(f"EMP{i:05d}", i) for i in range(1, users + 1)]
+    counts["user_mapping"] = _flush(cursor, backend, "user_mapping", mapping)
+
+    pending = {table: [] for table in TABLES}
+    for table, row in generate_history(punches, users, start, zoho_ratio, seed):
+        pending[table].append(row)
+        if len(pending[table]) >= BATCH_SIZE:
+            counts[table] += _flush(cursor, backend, table, pending[table])
+            pending[table] = []
+            conn.commit()
+    for table, rows in pending.items():
+        if rows:
+            counts[table] += _flush(cursor, backend, table, rows)
+    conn.commit()
+    cursor.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed a benchmark database with synthetic punches")
+    parser.add_argument("--backend", choices=["mysql", "sqlite"], default="mysql")
+    parser.add_argument("--database", default="zk_attendance_bench", help="MariaDB database name")
+    parser.add_argument("--sqlite-path", default="zk_attendance_bench.sqlite3")
+    parser.add_argument("--punches", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--zoho-ratio", type=float, default=0.1)
+    parser.add_argument("--keep", action="store_true", help="append instead of truncating first")
+    args = parser.parse_args()
+
+    if args.backend == "sqlite":
+        conn = connect_sqlite(args.sqlite_path)
+    else:
+        conn = connect_mysql(args.database)
+
+    create_schema(conn, args.backend)
+    if not args.keep:
+        reset_tables(conn, args.backend)
+
+    started = time.perf_counter()
+    counts = seed(conn, args.backend, args.punches, args.users, zoho_ratio=args.zoho_ratio)
+    elapsed = time.perf_counter() - started
+    conn.close()
+
+    total = sum(counts.values())
+    for table, count in counts.items():
+        print(f"{table:>16}: {count} rows")
+    print(f"Seeded {total} rows in {elapsed:.1f}s ({total / elapsed:.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""Local HTTP stand-in for the Zoho accounts and People endpoints.
+
+Serves the token, attendance push, ``getRecords`` and
+``fetchLatestAttEntries`` calls made by ``zoholog_to_db.py`` and
+``sync_to_zoho.py``. Point the scripts at it with ``ZOHO_ACCOUNTS_URL`` and
+``ZOHO_PEOPLE_URL``. Every response can be delayed by a fixed latency and a
+fraction of them can be answered with HTTP 429.
+
+Run standalone with ``python3 benchmarks/zoho_stub.py --port 8765``.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class ZohoStubState:
+    def __init__(self, employees=(), latency=0.0, rate_429=0.0, seed=0):
+        self.employees = list(employees)
+        self.latency = latency
+        self.rate_429 = rate_429
+        self.day_entries = defaultdict(lambda: defaultdict(list))
+        self.pushes = []
+        self.requests = Counter()
+        self.throttled = Counter()
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def add_att_entry(self, emp_id, check_in=None, check_out=None):
+        """Register a Zoho-side punch pair returned by ``fetchLatestAttEntries``."""
+        moment = check_in or check_out
+        entry = {}
+        if check_in:
+            entry["checkInTime"] = check_in.strftime("%d-%m-%Y %H:%M:%S")
+        if check_out:
+            entry["checkOutTime"] = check_out.strftime("%d-%m-%Y %H:%M:%S")
+        self.day_entries[emp_id][moment.strftime("%d-%m-%Y")].append(entry)
+
+    def should_throttle(self, endpoint):
+        with self._lock:
+            self.requests[endpoint] += 1
+            if self.rate_429 and self._rng.random() < self.rate_429:
+                self.throttled[endpoint] += 1
+                return True
+        return False
+
+    def record_push(self, payload):
+        with self._lock:
+            self.pushes.append(payload)
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _read_body(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length).decode("utf-8") if length else ""
+            if self.headers.get("Content-Type", "").startswith("application/json"):
+                return json.loads(raw or "{}")
+            return {k: v[0] for k, v in parse_qs(raw).items()}
+
+        def _dispatch(self, method):
+            path = urlparse(self.path).path
+            endpoint = f"{method} {path}"
+            if state.latency:
+                time.sleep(state.latency)
+            if state.should_throttle(endpoint):
+                self._send_json(429, {"errors": {"code": 7073, "message": "Too many requests"}})
+                return
+
+            if path == "/oauth/v2/token":
+                self._read_body()
+                self._send_json(200, {"access_token": "stub-access-token", "expires_in": 3600})
+            elif path == "/people/api/forms/employee/getRecords":
+                self._read_body()
+                result = [{str(i): [{"EmployeeID": emp}]} for i, emp in enumerate(state.employees, 1)]
+                self._send_json(200, {"response": {"status": 0, "result": result}})
+            elif path == "/people/api/attendance":
+                state.record_push(self._read_body())
+                self._send_json(200, {"response": {"status": 0}})
+            elif path == "/people/api/attendance/fetchLatestAttEntries":
+                result = [
+                    {
+                        "employeeId": emp_id,
+                        "entries": [{day: {"attEntries": entries}} for day, entries in days.items()],
+                    }
+                    for emp_id, days in state.day_entries.items()
+                ]
+                self._send_json(200, {"response": {"status": 0, "result": result}})
+            else:
+                self._send_json(404, {"error": f"unknown endpoint {path}"})
+
+        def do_GET(self):
+            self._dispatch("GET")
+
+        def do_POST(self):
+            self._dispatch("POST")
+
+    return Handler
+
+
+class ZohoStubServer:
+    """Runs the stub in a background thread; use as a context manager."""
+
+    def __init__(self, state, host="127.0.0.1", port=0):
+        self.state = state
+        self.httpd = ThreadingHTTPServer((host, port), make_handler(state))
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Zoho People API stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--employees", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="fraction of requests answered with 429")
+    args = parser.parse_args()
+
+    state = ZohoStubState(
+        employees=[f"EMP{i:05d}" for i in range(1, args.employees + 1)],
+        latency=args.latency,
+        rate_429=args.rate_429,
+    )
+    server = ZohoStubServer(state, args.host, args.port)
+    print(f"Zoho stub listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import os
+import sys
+import gzip
+import json
+import time
+import argparse
+from datetime import datetime, date
+from decimal import Decimal
+import mysql.connector
+from pymysqlreplication import BinLogStreamReader
+from pymysqlreplication.event import XidEvent
+from pymysqlreplication.row_event import WriteRowsEvent, UpdateRowsEvent, DeleteRowsEvent
+from incremental_backup import (
+    BACKUP_DIR, TABLES, DB_HOST, DB_USER, DB_PASSWORD, DB_NAME,
+    format_value, upload_to_gdrive
+)
+
+# Change-data-capture backups from the MariaDB binary log.
+#
+# Every INSERT, UPDATE (e.g. sync_to_zoho's `synced` flag) and DELETE (e.g.
+# order_table's cleanup) on the attendance tables is written to gzipped JSON
+# Lines segments, so the backups replay into an exact copy. Requires
+# binlog_format=ROW and binlog_row_image=FULL on the server, and a user with
+# REPLICATION SLAVE and REPLICATION CLIENT privileges.
+
+CDC_DIR = os.path.join(BACKUP_DIR, "cdc")
+CHECKPOINT_FILE = "binlog_checkpoint.json"
+# Must differ from the server's and any replica's server_id
+SERVER_ID = int(os.getenv("BINLOG_SERVER_ID", "4370"))
+DB_PORT = int(os.getenv("DB_PORT", "3306"))
+SEGMENT_SECONDS = int(os.getenv("BINLOG_SEGMENT_SECONDS", "300"))
+
+os.makedirs(CDC_DIR, exist_ok=True)
+
+def load_checkpoint():
+    if os.path.exists(CHECKPOINT_FILE):
+        with open(CHECKPOINT_FILE, "r") as f:
+            return json.load(f)
+    return None
+
+def save_checkpoint(log_file, log_pos, since):
+    # since: when capture first started; every change after it is in a segment
+    tmp_path = f"{CHECKPOINT_FILE}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"log_file": log_file, "log_pos": log_pos, "since": since, "saved_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}, f, indent=2)
+    os.replace(tmp_path, CHECKPOINT_FILE)
+
+def json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat(sep=" ") if isinstance(value, datetime) else value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, bytes):
+        return value.decode("utf-8", errors="replace")
+    return value
+
+def json_row(values):
+    return {k: json_value(v) for k, v in values.items()}
+
+def check_server():
+    conn = mysql.connector.connect(host=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=DB_NAME)
+    cursor = conn.cursor()
+    cursor.execute(
+        "SHOW VARIABLES WHERE Variable_name IN ('log_bin', 'binlog_format', 'binlog_row_image', 'binlog_row_metadata')"
+    )
+    settings = {name: value for name, value in cursor.fetchall()}
+    cursor.execute("SHOW MASTER STATUS")
+    status = cursor.fetchone()
+    cursor.close()
+    conn.close()
+
+    problems = []
+    if settings.get("log_bin", "OFF").upper() != "ON":
+        problems.append("log_bin is OFF")
+    if settings.get("binlog_format", "").upper() != "ROW":
+        problems.append(f"binlog_format is {settings.get('binlog_format')} (need ROW)")
+    if settings.get("binlog_row_image", "FULL").upper() != "FULL":
+        problems.append(f"binlog_row_image is {settings.get('binlog_row_image')} (need FULL)")
+    # mysql-replication 1.x takes column names from the optional metadata; without it rows have no usable keys
+    if "binlog_row_metadata" not in settings:
+        problems.append("binlog_row_metadata is not supported by this server (need MariaDB 10.5 or later)")
+    elif settings["binlog_row_metadata"].upper() != "FULL":
+        problems.append(f"binlog_row_metadata is {settings['binlog_row_metadata']} (need FULL)")
+    if problems:
+        raise SystemExit("[ERROR] Binlog capture unavailable: " + "; ".join(problems))
+    return status[0], status[1]
+
+# ===== CAPTURE =====
+def event_records(event):
+    table = event.table
+    if isinstance(event, WriteRowsEvent):
+        return [{"op": "insert", "table": table, "after": json_row(r["values"])} for r in event.rows]
+    if isinstance(event, UpdateRowsEvent):
+        return [
+            {"op": "update", "table": table, "before": json_row(r["before_values"]), "after": json_row(r["after_values"])}
+            for r in event.rows
+        ]
+    return [{"op": "delete", "table": table, "before": json_row(r["values"])} for r in event.rows]
+
+def write_segment(records, start, end):
+    now_str = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"cdc_{now_str}_{start[0]}_{start[1]}.jsonl.gz"
+    filepath = os.path.join(CDC_DIR, filename)
+    with gzip.open(filepath, "wt", encoding="utf-8") as f:
+        f.write(json.dumps({"op": "segment", "start": list(start), "end": list(end)}) + "\n")
+        for record in records:
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+    print(f"[+] Wrote {len(records)} changes to {filename}")
+    return filepath
+
+def capture(follow=False, upload=True):
+    current_file, current_pos = check_server()
+    checkpoint = load_checkpoint()
+    if checkpoint:
+        log_file, log_pos = checkpoint["log_file"], checkpoint["log_pos"]
+        # Checkpoints written before `since` existed: their saved_at is a safe, later bound
+        since = checkpoint.get("since", checkpoint["saved_at"])
+    else:
+        # No checkpoint yet: changes are captured from now on; take a full 'select' backup as the baseline
+        log_file, log_pos = current_file, current_pos
+        since = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        save_checkpoint(log_file, log_pos, since)
+        print(f"[!] No binlog checkpoint; starting at {log_file}:{log_pos}. Run a full backup as the baseline.")
+
+    stream = BinLogStreamReader(
+        connection_settings={"host": DB_HOST, "port": DB_PORT, "user": DB_USER, "passwd": DB_PASSWORD},
+        server_id=SERVER_ID,
+        only_schemas=[DB_NAME],
+        only_tables=TABLES,
+        only_events=[WriteRowsEvent, UpdateRowsEvent, DeleteRowsEvent, XidEvent],
+        log_file=log_file,
+        log_pos=log_pos,
+        resume_stream=True,
+        blocking=follow,
+    )
+
+    segment_start = (log_file, log_pos)
+    committed = []
+    pending = []
+    committed_at = segment_start
+    segment_opened = time.monotonic()
+    total = 0
+
+    def flush():
+        nonlocal committed, segment_start, segment_opened, total
+        if committed:
+            filepath = write_segment(committed, segment_start, committed_at)
+            if upload:
+                upload_to_gdrive(filepath)
+            total += len(committed)
+        # Only advance past changes that are safely on disk
+        save_checkpoint(*committed_at, since)
+        committed = []
+        segment_start = committed_at
+        segment_opened = time.monotonic()
+
+    try:
+        for event in stream:
+            if isinstance(event, XidEvent):
+                # Transaction boundary: rows seen so far are committed and safe to resume after
+                committed.extend(pending)
+                pending = []
+                committed_at = (stream.log_file, stream.log_pos)
+                if follow and time.monotonic() - segment_opened >= SEGMENT_SECONDS:
+                    flush()
+                continue
+            for record in event_records(event):
+                record["ts"] = event.timestamp
+                pending.append(record)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stream.close()
+        flush()
+    print(f"\n✅ Binlog capture complete: {total} changes, checkpoint {committed_at[0]}:{committed_at[1]}")
+
+# ===== APPLY SEGMENTS =====
+def change_to_sql(record):
+    table = record["table"]
+    if record["op"] == "delete":
+        return f"DELETE FROM `{table}` WHERE `id` = {format_value(record['before']['id'])};"
+    after = record["after"]
+    columns = ", ".join(f"`{c}`" for c in after)
+    values = ", ".join(format_value(v) for v in after.values())
+    statement = f"REPLACE INTO `{table}` ({columns}) VALUES ({values});"
+    if record["op"] == "update" and record["before"]["id"] != after["id"]:
+        statement = f"DELETE FROM `{table}` WHERE `id` = {format_value(record['before']['id'])};\n" + statement
+    return statement
+
+def apply_segments(paths, out):
+    for path in sorted(paths):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                if record["op"] == "segment":
+                    out.write(f"-- {os.path.basename(path)}: {record['start']} .. {record['end']}\n")
+                    continue
+                out.write(change_to_sql(record) + "\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="Binlog change-capture backups")
+    sub = parser.add_subparsers(dest="command", required=True)
+    cap = sub.add_parser("capture", help="read new binlog events into a change segment")
+    cap.add_argument("--follow", action="store_true", help=f"keep tailing; cut a segment every {SEGMENT_SECONDS}s")
+    cap.add_argument("--no-upload", action="store_true", help="keep segments local")
+    app = sub.add_parser("apply", help="convert segments to SQL that replays them onto a copy")
+    app.add_argument("segments", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "capture":
+        capture(follow=args.follow, upload=not args.no_upload)
+    else:
+        apply_segments(args.segments, sys.stdout)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import logging
+import argparse
+from datetime import datetime, timedelta
+import storage
+from dotenv import load_dotenv
+import log_setup
+
+# ===== LOAD ENVIRONMENT VARIABLES =====
+load_dotenv("e.env")
+
+# A check-out this soon after an open check-in on the previous day closes that shift (night shifts)
+MAX_SHIFT = timedelta(hours=16)
+
+# ===== AFFECTED KEYS =====
+def day_keys(rows):
+    """Map (user_id, timestamp) pairs to the (user_id, date) summary keys they touch."""
+    return {(int(user_id), timestamp.date()) for user_id, timestamp in rows}
+
+# ===== ASSIGN PUNCHES TO WORK DAYS =====
+def assign_work_days(punches):
+    """(name, timestamp, punch_type) sorted by time -> {work_date: [(name, timestamp, punch_type)]}.
+
+    A shift belongs to the day it started on: a check-out closing a check-in
+    from the previous evening is counted on the check-in's day.
+    """
+    by_day = {}
+    open_since = None
+    for name, timestamp, punch_type in punches:
+        day = timestamp.date()
+        if punch_type == 0:
+            open_since = timestamp
+        else:
+            if open_since is not None and timestamp - open_since <= MAX_SHIFT:
+                day = open_since.date()
+            open_since = None
+        by_day.setdefault(day, []).append((name, timestamp, punch_type))
+    return by_day
+
+# ===== SUMMARISE ONE DAY =====
+def summarise_day(punches):
+    """punches: (timestamp, punch_type) sorted by time -> (first_in, last_out, count, worked_seconds)."""
+    first_in = None
+    last_out = None
+    worked_seconds = 0
+    open_since = None
+    for timestamp, punch_type in punches:
+        if punch_type == 0:
+            if first_in is None:
+                first_in = timestamp
+            open_since = timestamp
+        else:
+            last_out = timestamp
+            if open_since is not None:
+                worked_seconds += int((timestamp - open_since).total_seconds())
+                open_since = None
+    return first_in, last_out, len(punches), worked_seconds
+
+# ===== RECOMPUTE AFFECTED (user_id, date) KEYS =====
+def refresh_summary(cursor, keys):
+    """Recompute daily_attendance_summary rows for keys using the caller's cursor/transaction."""
+    by_user = {}
+    for user_id, day in keys:
+        by_user.setdefault(user_id, set()).add(day)
+
+    for user_id, days in by_user.items():
+        # A punch can move a night shift's check-out onto or off the neighbouring days
+        days = days | {d + timedelta(days=step) for d in days for step in (-1, 1)}
+        # One extra day on each side so every shift touching these days is seen whole
+        start = datetime.combine(min(days), datetime.min.time()) - timedelta(days=1)
+        end = datetime.combine(max(days), datetime.min.time()) + timedelta(days=2)
+        cursor.execute("""
+            SELECT name, timestamp, punch_type FROM attendance_logs
+            WHERE user_id = %s AND timestamp >= %s AND timestamp < %s
+            ORDER BY timestamp
+        """, (user_id, start, end))
+        punches_by_day = assign_work_days(cursor.fetchall())
+
+        rows = []
+        for day in days:
+            punches = punches_by_day.get(day)
+            if punches:
+                summary = summarise_day([(timestamp, punch_type) for _, timestamp, punch_type in punches])
+                rows.append((user_id, day, punches[-1][0]) + summary)
+            else:
+                cursor.execute(
+                    "DELETE FROM daily_attendance_summary WHERE user_id = %s AND work_date = %s",
+                    (user_id, day)
+                )
+        if rows:
+            cursor.executemany("""
+                REPLACE INTO daily_attendance_summary
+                    (user_id, work_date, name, first_in, last_out, punch_count, worked_seconds)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """, rows)
+    return len(keys)
+
+def refresh_daily_summary(keys):
+    """Open a connection and refresh keys; failures are logged because the summary can be rebuilt."""
+    if not keys:
+        return 0
+    conn = None
+    try:
+        conn = storage.connect()
+        cursor = conn.cursor()
+        refreshed = refresh_summary(cursor, keys)
+        conn.commit()
+        logging.info(f"📊 Refreshed {refreshed} daily summary rows")
+        return refreshed
+    except storage.Error as err:
+        logging.error(f"❌ Database error refreshing daily summary: {err}")
+        return 0
+    finally:
+        if conn and conn.is_connected():
+            cursor.close()
+            conn.close()
+
+# ===== REBUILD A DATE RANGE =====
+def rebuild(cursor, date_from, date_to):
+    cursor.execute("""
+        SELECT DISTINCT user_id, DATE(timestamp) FROM attendance_logs
+        WHERE timestamp >= %s AND timestamp < %s
+    """, (date_from, date_to + timedelta(days=1)))
+    keys = {(user_id, day) for user_id, day in cursor.fetchall()}
+    # Drop rows for days that no longer have any punches
+    cursor.execute(
+        "DELETE FROM daily_attendance_summary WHERE work_date >= %s AND work_date <= %s",
+        (date_from, date_to)
+    )
+    return refresh_summary(cursor, keys)
+
+# ===== REPORT =====
+def fetch_report(cursor, date_from, date_to, user_id=None):
+    query = """
+        SELECT user_id, name, work_date, first_in, last_out, punch_count, worked_seconds
+        FROM daily_attendance_summary
+        WHERE work_date >= %s AND work_date <= %s
+    """
+    params = [date_from, date_to]
+    if user_id is not None:
+        query += " AND user_id = %s"
+        params.append(user_id)
+    cursor.execute(query + " ORDER BY work_date, user_id", params)
+    return cursor.fetchall()
+
+def format_hours(seconds):
+    return f"{seconds // 3600:d}:{seconds % 3600 // 60:02d}"
+
+# ===== MAIN =====
+def main():
+    parser = argparse.ArgumentParser(description="Daily attendance summary (first in, last out, worked hours)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("report", "print the summary"), ("rebuild", "recompute the summary from attendance_logs")):
+        cmd = sub.add_parser(name, help=help_text)
+        cmd.add_argument("--from", dest="date_from", required=True, help="YYYY-MM-DD")
+        cmd.add_argument("--to", dest="date_to", help="YYYY-MM-DD (default: same as --from)")
+        if name == "report":
+            cmd.add_argument("--user", type=int, help="device user ID")
+    args = parser.parse_args()
+
+    log_setup.configure_logging()
+    date_from = datetime.strptime(args.date_from, "%Y-%m-%d").date()
+    date_to = datetime.strptime(args.date_to, "%Y-%m-%d").date() if args.date_to else date_from
+
+    conn = storage.connect()
+    cursor = conn.cursor()
+    try:
+        if args.command == "rebuild":
+            count = rebuild(cursor, date_from, date_to)
+            conn.commit()
+            logging.info(f"✅ Rebuilt {count} daily summary rows from {date_from} to {date_to}")
+        else:
+            print(f"{'date':<11} {'user':>6} {'name':<20} {'first in':<9} {'last out':<9} {'punches':>7} {'worked':>7}")
+            for user_id, name, work_date, first_in, last_out, punches, worked in fetch_report(cursor, date_from, date_to, args.user):
+                print(
+                    f"{work_date!s:<11} {user_id:>6} {(name or ''):<20} "
+                    f"{first_in.strftime('%H:%M:%S') if first_in else '-':<9} "
+                    f"{last_out.strftime('%H:%M:%S') if last_out else '-':<9} "
+                    f"{punches:>7} {format_hours(worked):>7}"
+                )
+    finally:
+        cursor.close()
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+import os
+import json
+import fcntl
+import struct
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from dotenv import load_dotenv
+from punch_batch import PunchBatch, UNKNOWN, from_epoch, to_epoch
+
+# ===== LOAD ENVIRONMENT VARIABLES =====
+load_dotenv(dotenv_path='e.env')
+
+# Append-only spool of raw device punches. Each record is a 4-byte big-endian
+# length followed by a UTF-8 JSON payload, so a write cut short by a crash
+# leaves at most one incomplete record at the tail, which readers ignore.
+SPOOL_FILE = os.getenv('SPOOL_FILE', 'device_spool.bin')
+# Newest spooled timestamp per device, so each poll appends only punches not spooled before
+WATERMARK_SUFFIX = '.watermark.json'
+# Running count of punches ever appended per device; the scheduler's activity signal without reading the spool
+APPENDED_SUFFIX = '.appended.json'
+LENGTH_PREFIX = struct.Struct('>I')
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+@contextmanager
+def spool_lock(path=SPOOL_FILE):
+    # Lock a sidecar file: commit_spool() replaces the spool itself
+    with open(f"{path}.lock", 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def encode_punch(punch):
+    payload = json.dumps({
+        'user_id': punch.user_id,
+        'name': punch.name,
+        'timestamp': punch.timestamp.strftime(TIMESTAMP_FORMAT),
+        'device_ip': punch.device_ip
+    }, separators=(',', ':')).encode('utf-8')
+    return LENGTH_PREFIX.pack(len(payload)) + payload
+
+
+def decode_punch(payload, batch):
+    punch = json.loads(payload.decode('utf-8'))
+    timestamp = datetime.strptime(punch['timestamp'], TIMESTAMP_FORMAT)
+    batch.append(punch['user_id'], timestamp, UNKNOWN, punch['name'], punch['device_ip'])
+
+
+def complete_length(f):
+    # Walk the length prefixes to find where the last complete record ends
+    size = os.fstat(f.fileno()).st_size
+    offset = 0
+    while offset + LENGTH_PREFIX.size <= size:
+        f.seek(offset)
+        (length,) = LENGTH_PREFIX.unpack(f.read(LENGTH_PREFIX.size))
+        if offset + LENGTH_PREFIX.size + length > size:
+            break
+        offset += LENGTH_PREFIX.size + length
+    return offset, size
+
+
+def load_watermarks(path=SPOOL_FILE):
+    try:
+        with open(path + WATERMARK_SUFFIX) as f:
+            return {ip: datetime.strptime(ts, TIMESTAMP_FORMAT) for ip, ts in json.load(f).items()}
+    except (OSError, ValueError):
+        return {}
+
+
+def save_json(target, data):
+    tmp_path = target + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, target)
+
+
+def save_watermarks(watermarks, path=SPOOL_FILE):
+    save_json(path + WATERMARK_SUFFIX, {ip: ts.strftime(TIMESTAMP_FORMAT) for ip, ts in watermarks.items()})
+
+
+def load_appended(path=SPOOL_FILE):
+    try:
+        with open(path + APPENDED_SUFFIX) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def appended_count(device_ip, path=SPOOL_FILE):
+    """Punches appended for device_ip so far; compare before and after a poll to get that poll's new punches."""
+    return load_appended(path).get(device_ip, 0)
+
+
+# ===== APPEND FETCHED PUNCHES =====
+def append_punches(batch, path=SPOOL_FILE):
+    with spool_lock(path):
+        watermarks = load_watermarks(path)
+        # Compare in epoch seconds per interned device, without materialising a datetime per punch
+        floors = [to_epoch(watermarks[ip]) if ip in watermarks else None for ip in batch.devices]
+        punches = batch.filter(
+            lambda i: floors[batch.device_ids[i]] is None or batch.timestamps[i] > floors[batch.device_ids[i]]
+        )
+        if not punches:
+            logging.info("ℹ️ No punches newer than the spool watermark.")
+            return 0
+
+        data = b''.join(encode_punch(p) for p in punches)
+        with open(path, 'a+b') as f:
+            valid, size = complete_length(f)
+            if valid < size:
+                # A previous append was interrupted; appending after it would misalign every record
+                logging.warning(f"⚠️ Truncating {size - valid} bytes of incomplete record at end of {path}")
+                f.truncate(valid)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+        newest = {}
+        appended = load_appended(path)
+        for device_id, epoch in zip(punches.device_ids, punches.timestamps):
+            if device_id not in newest or epoch > newest[device_id]:
+                newest[device_id] = epoch
+            device_ip = punches.devices[device_id]
+            appended[device_ip] = appended.get(device_ip, 0) + 1
+        for device_id, epoch in newest.items():
+            watermarks[punches.devices[device_id]] = from_epoch(epoch)
+        save_watermarks(watermarks, path)
+        save_json(path + APPENDED_SUFFIX, appended)
+    logging.info(f"💾 Spooled {len(punches)} punches to {path}")
+    return len(punches)
+
+
+# ===== READ PENDING PUNCHES =====
+def read_punches(path=SPOOL_FILE):
+    """Return (PunchBatch, end_offset); end_offset is what commit_spool() needs once they are stored."""
+    punches = PunchBatch()
+    if not os.path.exists(path):
+        return punches, 0
+    with spool_lock(path):
+        with open(path, 'rb') as f:
+            data = f.read()
+
+    offset = 0
+    while offset + LENGTH_PREFIX.size <= len(data):
+        (length,) = LENGTH_PREFIX.unpack_from(data, offset)
+        end = offset + LENGTH_PREFIX.size + length
+        if end > len(data):
+            break
+        decode_punch(data[offset + LENGTH_PREFIX.size:end], punches)
+        offset = end
+
+    if offset < len(data):
+        logging.warning(f"⚠️ Ignoring {len(data) - offset} bytes of incomplete record at end of {path}")
+    return punches, offset
+
+
+def has_pending(path=SPOOL_FILE):
+    return os.path.exists(path) and os.path.getsize(path) > 0
+
+
+# ===== DROP DRAINED PUNCHES =====
+def commit_spool(end_offset, path=SPOOL_FILE):
+    """Remove everything before end_offset, keeping punches appended while draining."""
+    if not end_offset or not os.path.exists(path):
+        return
+    with spool_lock(path):
+        with open(path, 'rb') as f:
+            f.seek(end_offset)
+            remaining = f.read()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(remaining)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
@@ -2,16 +2,7 @@ import requests
 import json
 import logging
 from typing import Dict
-
-def configure_logging():
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('zoho_auth.log'),
-            logging.StreamHandler()
-        ]
-    )
+import log_setup
 
 class ZohoAuthManager:
     def __init__(self, client_id: str, client_secret: str, redirect_uri: str):
@@ -65,7 +56,7 @@ class ZohoAuthManager:
 
 # ==== MAIN ====
 if __name__ == "__main__":
-    configure_logging()
+    log_setup.configure_logging('zoho_auth.log')
 
     print("\n🔧 Enter your Zoho API credentials:")
     client_id = input("Client ID: ").strip()
@@ -1,16 +1,7 @@
 from zk import ZK, const
 import logging
 from datetime import datetime
-
-def configure_logging():
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('zk_device_logs.log'),
-            logging.StreamHandler()
-        ]
-    )
+import log_setup
 
 def get_attendance_records(ip: str, port: int, password: int) -> list:
     zk = ZK(
@@ -53,7 +44,7 @@ def get_attendance_records(ip: str, port: int, password: int) -> list:
             logging.info("Device connection closed")
 
 def main():
-    configure_logging()
+    log_setup.configure_logging('zk_device_logs.log')
     
     # Device configuration
     device_config = {
@@ -1,8 +1,9 @@
 import os
 import json
+import argparse
 from datetime import datetime
 from dotenv import load_dotenv
-import mysql.connector
+import storage
 from pydrive.auth import GoogleAuth
 from pydrive.drive import GoogleDrive
 
@@ -89,14 +90,20 @@ def upload_to_gdrive(filepath):
     print(f"[+] Uploaded {filepath} to Google Drive")
 
 def main():
+    parser = argparse.ArgumentParser(description="Incremental backup of the attendance tables")
+    parser.add_argument("--mode", choices=["select", "binlog"], default="select",
+                        help="'select' copies rows newer than the last backup; 'binlog' captures every change from the binary log")
+    args = parser.parse_args()
+    if args.mode == "binlog":
+        if storage.DB_BACKEND != "mysql":
+            raise SystemExit("[ERROR] Binlog capture needs the MariaDB backend (DB_BACKEND=mysql)")
+        import binlog_backup
+        binlog_backup.capture()
+        return
+
     last_times = load_last_backup_times()
     try:
-        conn = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME,
-        )
+        conn = storage.connect()
         cursor = conn.cursor()
 
         updated_times = last_times.copy()
@@ -1,264 +1,225 @@
 from zk import ZK
 import logging
+import argparse
+import json
+import time
 from datetime import datetime
-import mysql.connector
+import storage
 import os
 from dotenv import load_dotenv
+import device_spool
+import daily_summary
+import leases
+import log_setup
+import profiling
+from punch_batch import PunchBatch, CHECK_IN, CHECK_OUT, STATUS_NAMES, from_epoch, to_epoch
 
 # ===== LOAD ENVIRONMENT VARIABLES =====
 load_dotenv(dotenv_path='e.env')
 
-DB_CONFIG = {
-    'host': os.getenv('DB_HOST'),
-    'user': os.getenv('DB_USER'),
-    'password': os.getenv('DB_PASS'),
-    'database': os.getenv('DB_NAME')
-}
-
 DEVICE_CONFIG = {
     'ip': os.getenv('DEVICE_IP'),
     'port': int(os.getenv('DEVICE_PORT')),
     'password': int(os.getenv('DEVICE_PASSWORD'))
 }
 
-# ===== LOGGING SETUP =====
-def configure_logging():
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('zk_device_logs.log'),
-            logging.StreamHandler()
-        ]
-    )
-
-# ===== GET LATEST TIMESTAMP FOR DEVICE LOGS =====
-def get_latest_device_timestamp():
-    try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-        cursor.execute("SELECT MAX(timestamp) FROM attendance_logs WHERE source = 'device'")
-        result = cursor.fetchone()
-        return result[0] if result and result[0] else datetime.min
-    except mysql.connector.Error as err:
-        logging.error(f"❌ MySQL Error while fetching latest device timestamp: {err}")
-        return datetime.min
-    finally:
-        if conn and conn.is_connected():
-            cursor.close()
-            conn.close()
-
-# ===== GET LAST STATUS FROM DATABASE =====
-def get_last_status(user_id):
-    try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute(
-            "SELECT punch_type FROM attendance_logs WHERE user_id = %s ORDER BY timestamp DESC LIMIT 1",
-            (user_id,)
-        )
-        result = cursor.fetchone()
-        return 'Check-In' if result and result['punch_type'] == 0 else 'Check-Out' if result else None
-    except mysql.connector.Error as err:
-        logging.error(f"❌ MySQL Error while checking last status: {err}")
-        return None
-    finally:
-        if conn and conn.is_connected():
-            cursor.close()
-            conn.close()
+# Employees cannot punch while the device is disabled; warn when a transfer holds it longer than this
+DEVICE_LOCK_SLA_SECONDS = float(os.getenv('DEVICE_LOCK_SLA_SECONDS', '10'))
+DEVICE_LOCK_METRICS_FILE = os.getenv('DEVICE_LOCK_METRICS_FILE', 'device_lock_metrics.jsonl')
 
-# ===== CHECK IF LOG EXISTS IN attendance_logs =====
-def log_exists_in_attendance(user_id, timestamp):
-    try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT COUNT(*) FROM attendance_logs WHERE user_id = %s AND timestamp = %s",
-            (user_id, timestamp)
+# ===== RECORD HOW LONG THE DEVICE WAS DISABLED =====
+def record_lock_metric(device_ip, disabled_seconds, record_count):
+    if disabled_seconds > DEVICE_LOCK_SLA_SECONDS:
+        logging.warning(
+            f"⏱️ Device {device_ip} was disabled for {disabled_seconds:.2f}s "
+            f"(SLA {DEVICE_LOCK_SLA_SECONDS:.0f}s) while transferring {record_count} records"
         )
-        count = cursor.fetchone()[0]
-        return count > 0
-    except mysql.connector.Error as err:
-        logging.error(f"❌ MySQL Error checking duplicate attendance log: {err}")
-        return False
-    finally:
-        if conn and conn.is_connected():
-            cursor.close()
-            conn.close()
-
-# ===== CHECK IF LOG EXISTS IN raw_device_logs =====
-def log_exists_in_raw(user_id, timestamp):
-    try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT COUNT(*) FROM raw_device_logs WHERE user_id = %s AND timestamp = %s",
-            (user_id, timestamp)
-        )
-        count = cursor.fetchone()[0]
-        return count > 0
-    except mysql.connector.Error as err:
-        logging.error(f"❌ MySQL Error checking duplicate raw device log: {err}")
-        return False
-    finally:
-        if conn and conn.is_connected():
-            cursor.close()
-            conn.close()
-
-# ===== INSERT INTO attendance_logs =====
-def insert_attendance_to_db(record):
-    conn = None
-    try:
-        # If exists in attendance_logs, skip
-        if log_exists_in_attendance(record['user_id'], record['timestamp']):
-            # Normal skip, do not log warning (to reduce noise)
-            return
-        
-        # If exists in raw_device_logs but not in attendance_logs, assume cleaned by order_table.py, skip insert to attendance_logs
-        if log_exists_in_raw(record['user_id'], record['timestamp']):
-            # Normal skip, do not log warning
-            return
-
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-
-        insert_query = """
-            INSERT INTO attendance_logs (user_id, name, timestamp, punch_type, synced, source)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """
-        punch_type = 0 if record['status'] == 'Check-In' else 1
-        values = (
-            record['user_id'],
-            record['name'],
-            record['timestamp'],
-            punch_type,
-            False,
-            'device'
-        )
-
-        cursor.execute(insert_query, values)
-        conn.commit()
-        logging.info(f"✅ Inserted attendance_logs: User {record['user_id']} ({record['name']}) {record['status']} at {record['timestamp']}")
-    except mysql.connector.Error as err:
-        logging.error(f"❌ MySQL Error inserting attendance log: {err}")
-    finally:
-        if conn and conn.is_connected():
-            cursor.close()
-            conn.close()
-
-# ===== INSERT INTO raw_device_logs =====
-def insert_raw_device_log(record):
-    conn = None
+    else:
+        logging.info(f"⏱️ Device {device_ip} was disabled for {disabled_seconds:.2f}s")
     try:
-        if log_exists_in_raw(record['user_id'], record['timestamp']):
-            # Normal skip, do not log warning
-            return
-
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-
-        insert_query = """
-            INSERT INTO raw_device_logs (user_id, name, timestamp, status, device_ip)
-            VALUES (%s, %s, %s, %s, %s)
-        """
-        values = (
-            record['user_id'],
-            record['name'],
-            record['timestamp'],
-            record['status'],
-            record['device_ip']
-        )
-
-        cursor.execute(insert_query, values)
-        conn.commit()
-        logging.info(f"🟢 Inserted raw_device_logs: User {record['user_id']} ({record['name']}) {record['status']} at {record['timestamp']}")
-    except mysql.connector.Error as err:
-        logging.error(f"❌ MySQL Error inserting raw device log: {err}")
-    finally:
-        if conn and conn.is_connected():
-            cursor.close()
-            conn.close()
-
-# ===== GET ATTENDANCE FROM DEVICE AND PROCESS =====
-def get_attendance_records(ip, port, password):
+        with open(DEVICE_LOCK_METRICS_FILE, 'a') as f:
+            f.write(json.dumps({
+                'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'device_ip': device_ip,
+                'disabled_seconds': round(disabled_seconds, 3),
+                'records': record_count,
+                'sla_seconds': DEVICE_LOCK_SLA_SECONDS
+            }) + '\n')
+    except OSError as e:
+        logging.error(f"❌ Could not write device lock metric: {e}")
+
+# ===== FETCH RAW PUNCHES FROM DEVICE (TRANSFER ONLY) =====
+def fetch_device_punches(ip, port, password):
     zk = ZK(ip=ip, port=port, password=password, force_udp=True, timeout=5, ommit_ping=False)
     conn = None
+    disabled_at = None
+    attendance, users = [], []
     try:
         conn = zk.connect()
         conn.disable_device()
+        disabled_at = time.perf_counter()
         logging.info("✅ Connected to device")
 
         attendance = conn.get_attendance()
         users = conn.get_users()
-        user_map = {u.user_id: u.name for u in users}
-
-        logging.info(f"📥 Fetched {len(attendance)} attendance records")
-        logging.info(f"👤 Fetched {len(users)} users from device")
-
-        # Filter only new logs based on last device source timestamp and exclude logs already in raw_device_logs
-        latest_timestamp = get_latest_device_timestamp()
-        logging.info(f"📌 Filtering logs after: {latest_timestamp}")
-        
-        filtered_logs = []
-        for log in attendance:
-            if log.timestamp > latest_timestamp:
-                if not log_exists_in_raw(log.user_id, log.timestamp):
-                    filtered_logs.append(log)
-
-        logging.info(f"🆕 {len(filtered_logs)} new records found")
-
-        # Sort by user then time
-        filtered_logs.sort(key=lambda x: (x.user_id, x.timestamp))
-
-        formatted_records = []
-        status_tracker = {}
-
-        for record in filtered_logs:
-            user_id = record.user_id
-            timestamp = record.timestamp
-            name = user_map.get(user_id, "Unknown")
-
-            # Determine alternating status for this user
-            if user_id not in status_tracker:
-                last_status = get_last_status(user_id)
-                current_status = 'Check-Out' if last_status == 'Check-In' else 'Check-In'
-            else:
-                last_status = status_tracker[user_id]
-                current_status = 'Check-Out' if last_status == 'Check-In' else 'Check-In'
-
-            status_tracker[user_id] = current_status
-
-            formatted_records.append({
-                'user_id': user_id,
-                'name': name,
-                'timestamp': timestamp,
-                'status': current_status,
-                'device_ip': ip
-            })
-
-        return formatted_records
-
     except Exception as e:
         logging.error(f"❌ Error fetching attendance from device: {e}")
-        return []
+        return PunchBatch()
     finally:
+        # Release the device as soon as the transfer is done; nothing below needs it
         if conn:
             conn.enable_device()
+            if disabled_at is not None:
+                record_lock_metric(ip, time.perf_counter() - disabled_at, len(attendance))
             conn.disconnect()
             logging.info("🔌 Disconnected from device")
 
-# ===== MAIN =====
-def main():
-    configure_logging()
-    records = get_attendance_records(**DEVICE_CONFIG)
+    logging.info(f"📥 Fetched {len(attendance)} attendance records")
+    logging.info(f"👤 Fetched {len(users)} users from device")
+
+    user_map = {u.user_id: u.name for u in users}
+    return PunchBatch.from_attendance(attendance, user_map, ip)
+
+# ===== FILTER NEW PUNCHES AND INFER CHECK-IN/CHECK-OUT =====
+def build_attendance_records(punches, cursor):
+    """Return (records, in_attendance) for a PunchBatch of punches not yet in raw_device_logs.
+
+    records is a new PunchBatch sorted by user then time with punch_types
+    filled in; in_attendance holds the (user_id, epoch) keys already in
+    attendance_logs. Works on the in-memory snapshot with a fixed number of
+    range queries instead of one connection per punch.
+    """
+    # Per device: devices are polled on their own schedules, so another device's newer punch says nothing about this one
+    floors = []
+    for device_ip in punches.devices:
+        latest_timestamp = None
+        if device_ip is not None:
+            cursor.execute("SELECT MAX(timestamp) FROM raw_device_logs WHERE device_ip = %s", (device_ip,))
+            latest_timestamp = cursor.fetchone()[0]
+            logging.info(f"📌 Filtering {device_ip} logs after: {latest_timestamp or 'the beginning'}")
+        floors.append(to_epoch(latest_timestamp) if latest_timestamp else None)
+
+    times = punches.timestamps
+    devices = punches.device_ids
+    candidates = [
+        i for i in range(len(punches))
+        if floors[devices[i]] is None or times[i] > floors[devices[i]]
+    ]
+    if not candidates:
+        logging.info("🆕 0 new records found")
+        return PunchBatch(), set()
+
+    since = from_epoch(min(times[i] for i in candidates))
+    cursor.execute("SELECT user_id, timestamp FROM raw_device_logs WHERE timestamp >= %s", (since,))
+    in_raw = {(int(u), to_epoch(t)) for u, t in cursor.fetchall()}
+    cursor.execute("SELECT user_id, timestamp FROM attendance_logs WHERE timestamp >= %s", (since,))
+    in_attendance = {(int(u), to_epoch(t)) for u, t in cursor.fetchall()}
+
+    users = punches.user_ids
+    seen = set()
+    filtered = []
+    for i in candidates:
+        key = (users[i], times[i])
+        if key not in in_raw and key not in seen:
+            seen.add(key)
+            filtered.append(i)
+    logging.info(f"🆕 {len(filtered)} new records found")
+
+    # Sort by user then time
+    filtered.sort(key=lambda i: (users[i] << 40) | times[i])
+    records = punches.take(filtered)
+
+    last_type = {}
+    for i, user_id in enumerate(records.user_ids):
+        # Determine alternating status for this user
+        if user_id not in last_type:
+            cursor.execute(
+                "SELECT punch_type FROM attendance_logs WHERE user_id = %s ORDER BY timestamp DESC LIMIT 1",
+                (user_id,)
+            )
+            row = cursor.fetchone()
+            last_type[user_id] = row[0] if row else None
+        current = CHECK_OUT if last_type[user_id] == CHECK_IN else CHECK_IN
+        records.punch_types[i] = current
+        last_type[user_id] = current
+
+    return records, in_attendance
+
+# ===== DRAIN SPOOL INTO DATABASE =====
+def drain_spool():
+    punches, end_offset = device_spool.read_punches()
+    if not punches:
+        logging.info("ℹ️ Spool is empty, nothing to drain.")
+        return 0
 
-    for idx, record in enumerate(records, 1):
-        logging.info(
-            f"📄 Record {idx}: User {record['user_id']} ({record['name']}) "
-            f"{record['status']} at {record['timestamp']}"
-        )
-        insert_attendance_to_db(record)
-        insert_raw_device_log(record)
+    conn = None
+    try:
+        conn = storage.connect()
+        cursor = conn.cursor()
+        records, in_attendance = build_attendance_records(punches, cursor)
+
+        raw_rows = []
+        attendance_rows = []
+        for record in records:
+            timestamp = record.timestamp
+            status = STATUS_NAMES[record.punch_type]
+            logging.debug(f"📄 User {record.user_id} ({record.name}) {status} at {timestamp}")
+            raw_rows.append((record.user_id, record.name, timestamp, status, record.device_ip))
+            if (record.user_id, record.epoch) not in in_attendance:
+                attendance_rows.append((record.user_id, record.name, timestamp, record.punch_type, False, 'device'))
+
+        if attendance_rows:
+            cursor.executemany("""
+                INSERT INTO attendance_logs (user_id, name, timestamp, punch_type, synced, source)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, attendance_rows)
+        if raw_rows:
+            cursor.executemany("""
+                INSERT INTO raw_device_logs (user_id, name, timestamp, status, device_ip)
+                VALUES (%s, %s, %s, %s, %s)
+            """, raw_rows)
+        conn.commit()
+    except storage.Error as err:
+        # Leave the spool in place; the next run retries the same punches
+        logging.error(f"❌ Database error draining spool, {len(punches)} punches kept for retry: {err}")
+        if conn and conn.is_connected():
+            conn.rollback()
+        return 0
+    finally:
+        if conn and conn.is_connected():
+            cursor.close()
+            conn.close()
+
+    device_spool.commit_spool(end_offset)
+    logging.info(f"✅ Drained spool: {len(attendance_rows)} attendance_logs, {len(raw_rows)} raw_device_logs rows inserted")
+    # Separate transaction: a failed summary refresh (e.g. a deadlock) must not undo or hold back the punches
+    daily_summary.refresh_daily_summary(daily_summary.day_keys((row[0], row[2]) for row in attendance_rows))
+    return len(raw_rows)
+
+# ===== MAIN =====
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Collect punches from the ZKTeco device into the database")
+    parser.add_argument(
+        "--collect-only", action="store_true",
+        help="spool device punches without loading them; keeps working while the database is down"
+    )
+    parser.add_argument("--drain-only", action="store_true", help="load spooled punches into the database without polling the device")
+    parser.add_argument("--device-ip", help="poll this device instead of DEVICE_IP")
+    args = parser.parse_args(argv)
+
+    log_setup.configure_logging('zk_device_logs.log')
+    if not args.drain_only:
+        device_config = dict(DEVICE_CONFIG, ip=args.device_ip or DEVICE_CONFIG['ip'])
+        # Only the node holding the device lease polls it; if the database is down, the node that held it last
+        with leases.Lease(f"device:{device_config['ip']}", offline_ok=True) as lease:
+            if lease.acquired:
+                punches = fetch_device_punches(**device_config)
+                device_spool.append_punches(punches)
+    if not args.collect_only:
+        # One drain at a time across nodes, so each user's check-in/out alternation sees the other nodes' rows
+        with leases.Lease("drain") as lease:
+            if lease.acquired:
+                drain_spool()
 
 if __name__ == "__main__":
-    main()
+    profiling.run_main(main, "insert_log_to_db")
@@ -0,0 +1,344 @@
+import os
+import json
+import math
+import socket
+import logging
+import threading
+from dotenv import load_dotenv
+import storage
+
+# Coordination between collector nodes sharing one database.
+#
+# A lease is a row in collector_leases owned by one node until expires_at.
+# Owners renew it by heartbeat; a node that stops heartbeating loses its
+# leases after LEASE_TTL_SECONDS and another node takes them over. All
+# expiry checks use the database clock, so node clocks may drift.
+#
+# Resources:
+#   node:<NODE_ID>      liveness of a scheduler, used to split devices fairly
+#   device:<ip>         the node that polls a device
+#   drain               loading spooled punches (keeps check-in/out alternation consistent)
+#   sync:<shard>/<n>    pushing unsynced rows with user_id % n == shard
+#   zoho-import, reconcile
+#
+# A SQLite database lives on one box, so with DB_BACKEND=sqlite there is no
+# other node to coordinate with and every lease is granted.
+#
+# Collection must keep working while the database is down. Each node records
+# in LEASE_STATE_FILE the leases it held last; when the database cannot be
+# reached, a device lease this node held last counts as held (offline_ok).
+
+# ===== LOAD ENVIRONMENT VARIABLES =====
+load_dotenv("e.env")
+
+NODE_ID = os.getenv("NODE_ID") or socket.gethostname()
+LEASE_TTL_SECONDS = int(os.getenv("LEASE_TTL_SECONDS", "90"))
+# An unreachable database must not hold up a device poll for long
+LEASE_CONNECT_TIMEOUT = int(os.getenv("LEASE_CONNECT_TIMEOUT", "5"))
+LEASE_STATE_FILE = os.getenv("LEASE_STATE_FILE", "lease_state.json")
+COORDINATED = storage.DB_BACKEND == "mysql"
+
+# ===== CONNECTION =====
+def connect():
+    from mysql.connector.constants import ClientFlag
+    # FOUND_ROWS: a renewal within the same second changes nothing but must still count as matched
+    return storage.connect(
+        client_flags=[ClientFlag.FOUND_ROWS], autocommit=True, connection_timeout=LEASE_CONNECT_TIMEOUT
+    )
+
+# ===== LOCAL RECORD OF LEASES HELD LAST =====
+def load_held_last():
+    try:
+        with open(LEASE_STATE_FILE) as f:
+            return set(json.load(f))
+    except (OSError, ValueError):
+        return set()
+
+def held_last(resource):
+    """True if this node was the last known holder of resource."""
+    return resource in load_held_last()
+
+def remember(resource, held):
+    resources = load_held_last()
+    if (resource in resources) == held:
+        return
+    if held:
+        resources.add(resource)
+    else:
+        resources.discard(resource)
+    try:
+        tmp_path = f"{LEASE_STATE_FILE}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(sorted(resources), f, indent=2)
+        os.replace(tmp_path, LEASE_STATE_FILE)
+    except OSError as e:
+        logging.error(f"❌ Could not write {LEASE_STATE_FILE}: {e}")
+
+# ===== LEASE PRIMITIVES =====
+def owner_of(cursor, resource):
+    """Current unexpired owner of resource, or None."""
+    cursor.execute(
+        "SELECT owner FROM collector_leases WHERE resource = %s AND expires_at >= NOW()",
+        (resource,)
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def acquire(cursor, resource, ttl=LEASE_TTL_SECONDS):
+    """Take resource if it is free, expired or already ours. Returns True when we hold it."""
+    cursor.execute("""
+        INSERT IGNORE INTO collector_leases (resource, owner, acquired_at, heartbeat_at, expires_at)
+        VALUES (%s, %s, NOW(), NOW(), NOW() + INTERVAL %s SECOND)
+    """, (resource, NODE_ID, ttl))
+    if cursor.rowcount == 1:
+        return True
+
+    cursor.execute("SELECT owner FROM collector_leases WHERE resource = %s", (resource,))
+    row = cursor.fetchone()
+    previous = row[0] if row else None
+    # Assignments run left to right, so owner is compared before it is overwritten
+    cursor.execute("""
+        UPDATE collector_leases
+        SET acquired_at = IF(owner = %s, acquired_at, NOW()),
+            heartbeat_at = NOW(),
+            expires_at = NOW() + INTERVAL %s SECOND,
+            owner = %s
+        WHERE resource = %s AND (owner = %s OR expires_at < NOW())
+    """, (NODE_ID, ttl, NODE_ID, resource, NODE_ID))
+    if cursor.rowcount != 1:
+        return False
+    if previous and previous != NODE_ID:
+        logging.warning(f"♻️ Took over expired lease {resource} from {previous}")
+    return True
+
+def renew(cursor, resource, ttl=LEASE_TTL_SECONDS):
+    """Extend a lease we still hold. False means it expired or was taken over."""
+    cursor.execute("""
+        UPDATE collector_leases SET heartbeat_at = NOW(), expires_at = NOW() + INTERVAL %s SECOND
+        WHERE resource = %s AND owner = %s AND expires_at >= NOW()
+    """, (ttl, resource, NODE_ID))
+    return cursor.rowcount == 1
+
+def release(cursor, resource):
+    cursor.execute("DELETE FROM collector_leases WHERE resource = %s AND owner = %s", (resource, NODE_ID))
+
+def live_nodes(cursor):
+    cursor.execute("SELECT COUNT(*) FROM collector_leases WHERE resource LIKE 'node:%' AND expires_at >= NOW()")
+    return cursor.fetchone()[0]
+
+def shard_order(shards):
+    """Shard indices starting at a node-specific offset, so nodes start on different shards."""
+    offset = sum(NODE_ID.encode()) % shards
+    return [(offset + i) % shards for i in range(shards)]
+
+# ===== SHORT-LIVED LEASE FOR ONE RUN =====
+class Lease:
+    """Hold resource for a `with` block, heartbeating in the background.
+
+    `acquired` tells whether the block may do the work; `lost` turns True if a
+    heartbeat fails, after which the block must stop. A lease this node already
+    held (e.g. the scheduler's device lease) is renewed but not released.
+
+    With offline_ok, a database that cannot be reached does not stop the
+    work if this node held the lease last; `unavailable` is then True and
+    nothing is heartbeated or released.
+    """
+
+    def __init__(self, resource, ttl=LEASE_TTL_SECONDS, offline_ok=False):
+        self.resource = resource
+        self.ttl = ttl
+        self.offline_ok = offline_ok
+        self.acquired = False
+        self.was_held = False
+        self.unavailable = False
+        self.conn = None
+        self._stop = threading.Event()
+        self._lost = threading.Event()
+        self._thread = None
+
+    @property
+    def lost(self):
+        return self._lost.is_set()
+
+    def __enter__(self):
+        if not COORDINATED:
+            self.acquired = True
+            return self
+        try:
+            self.conn = connect()
+            cursor = self.conn.cursor()
+            self.was_held = owner_of(cursor, self.resource) == NODE_ID
+            self.acquired = acquire(cursor, self.resource, self.ttl)
+            cursor.close()
+        except storage.Error as err:
+            self.unavailable = True
+            self.acquired = False
+            if self.offline_ok and held_last(self.resource):
+                logging.warning(
+                    f"⚠️ Database unavailable ({err}); continuing with {self.resource}, which this node held last"
+                )
+                self.acquired = True
+                return self
+            # Without coordination we cannot rule out another node doing the same work
+            logging.error(f"❌ Database error acquiring lease {self.resource}: {err}")
+        if self.acquired:
+            remember(self.resource, True)
+            self._thread = threading.Thread(target=self._heartbeat, daemon=True)
+            self._thread.start()
+        elif not self.unavailable:
+            remember(self.resource, False)
+            holder = None
+            try:
+                cursor = self.conn.cursor()
+                holder = owner_of(cursor, self.resource)
+                cursor.close()
+            except storage.Error:
+                pass
+            logging.info(f"🔒 {self.resource} is leased by {holder or 'another node'}; skipping")
+        return self
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.ttl / 3):
+            try:
+                cursor = self.conn.cursor()
+                renewed = renew(cursor, self.resource, self.ttl)
+                cursor.close()
+            except storage.Error as err:
+                logging.error(f"❌ Database error renewing lease {self.resource}: {err}")
+                renewed = False
+            if not renewed:
+                logging.error(f"❌ Lost lease {self.resource}; stopping work")
+                self._lost.set()
+                return
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        try:
+            if COORDINATED and self.acquired and not self.was_held and not self.lost and not self.unavailable:
+                cursor = self.conn.cursor()
+                release(cursor, self.resource)
+                cursor.close()
+        except storage.Error as err:
+            logging.error(f"❌ Database error releasing lease {self.resource}: {err}")
+        finally:
+            if self.conn is not None and self.conn.is_connected():
+                self.conn.close()
+        return False
+
+# ===== LONG-LIVED LEASES FOR THE SCHEDULER =====
+class LeaseKeeper:
+    """Keeps this node's liveness and device leases alive from a background thread."""
+
+    def __init__(self, ttl=LEASE_TTL_SECONDS):
+        self.ttl = ttl
+        self.held = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.conn = None
+        if not COORDINATED:
+            return
+        self.acquire(f"node:{NODE_ID}")
+        self._thread = threading.Thread(target=self._heartbeat, daemon=True)
+        self._thread.start()
+
+    def _cursor(self):
+        # The connection lives as long as the scheduler; reconnect after a database restart
+        if self.conn is None:
+            self.conn = connect()
+        else:
+            self.conn.ping(reconnect=True, attempts=3, delay=2)
+        return self.conn.cursor()
+
+    def acquire(self, resource):
+        with self._lock:
+            try:
+                cursor = self._cursor()
+                acquired = acquire(cursor, resource, self.ttl)
+                cursor.close()
+                if acquired:
+                    self.held.add(resource)
+                remember(resource, acquired)
+            except storage.Error as err:
+                logging.error(f"❌ Database error acquiring lease {resource}: {err}")
+            return resource in self.held
+
+    def release(self, resource):
+        with self._lock:
+            self.held.discard(resource)
+            try:
+                cursor = self._cursor()
+                release(cursor, resource)
+                cursor.close()
+            except storage.Error as err:
+                logging.error(f"❌ Database error releasing lease {resource}: {err}")
+
+    def live_nodes(self):
+        with self._lock:
+            try:
+                cursor = self._cursor()
+                count = live_nodes(cursor)
+                cursor.close()
+                return max(1, count)
+            except storage.Error as err:
+                logging.error(f"❌ Database error counting live nodes: {err}")
+                return 1
+
+    def balance_devices(self, device_ips):
+        """Hold a fair share of device leases: release extras, pick up free or expired ones."""
+        if not COORDINATED:
+            return list(device_ips)
+        try:
+            with self._lock:
+                self._cursor().close()
+        except storage.Error as err:
+            # Keep collecting into the local spool; the leases are sorted out once the database is back
+            mine = [ip for ip in device_ips if held_last(f"device:{ip}")]
+            logging.warning(f"⚠️ Database unavailable ({err}); polling the {len(mine)} devices this node held last")
+            return mine
+        if f"node:{NODE_ID}" not in self.held:
+            self.acquire(f"node:{NODE_ID}")
+        share = math.ceil(len(device_ips) / self.live_nodes())
+        mine = [ip for ip in device_ips if f"device:{ip}" in self.held]
+        for ip in mine[share:]:
+            logging.info(f"↔️ Releasing device {ip} to rebalance across nodes")
+            self.release(f"device:{ip}")
+            remember(f"device:{ip}", False)
+        mine = mine[:share]
+        for ip in device_ips:
+            if len(mine) >= share:
+                break
+            if ip not in mine and self.acquire(f"device:{ip}"):
+                logging.info(f"📟 Now polling device {ip}")
+                mine.append(ip)
+        return mine
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.ttl / 3):
+            with self._lock:
+                for resource in sorted(self.held):
+                    try:
+                        cursor = self._cursor()
+                        renewed = renew(cursor, resource, self.ttl)
+                        cursor.close()
+                        if not renewed:
+                            # Expired or taken over: another node may be the holder now
+                            remember(resource, False)
+                    except storage.Error as err:
+                        logging.error(f"❌ Database error renewing lease {resource}: {err}")
+                        renewed = False
+                    if not renewed:
+                        logging.error(f"❌ Lost lease {resource}")
+                        self.held.discard(resource)
+
+    def close(self):
+        if not COORDINATED:
+            return
+        self._stop.set()
+        self._thread.join()
+        for resource in sorted(self.held):
+            self.release(resource)
+        if self.conn is not None:
+            self.conn.close()
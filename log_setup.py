@@ -0,0 +1,77 @@
+import os
+import sys
+import json
+import queue
+import atexit
+import logging
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Shared logging for all scripts.
+#
+# Records are handed to a queue and written by a background listener, so a
+# stage never waits on file I/O. The log file holds one JSON object per line
+# and rotates by size; stdout keeps the familiar one-line text format.
+# Per-record detail is logged at DEBUG, per-batch summaries at INFO.
+
+LOG_DIR = os.getenv("LOG_DIR", ".")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+LOG_STDOUT = os.getenv("LOG_STDOUT", "1") != "0"
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Attributes every LogRecord has; anything else was passed with extra= and goes into the JSON
+STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "script": os.path.basename(sys.argv[0]) or record.module,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in STANDARD_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+def configure_logging(log_file=None, level=None):
+    """Route the root logger through a queue to a rotating JSON file and stdout.
+
+    Like logging.basicConfig, this does nothing if the root logger already has
+    handlers (e.g. the benchmark runner configured it).
+    """
+    global _listener
+    root = logging.getLogger()
+    if root.handlers:
+        return
+
+    handlers = []
+    if log_file:
+        file_handler = RotatingFileHandler(
+            os.path.join(LOG_DIR, log_file),
+            maxBytes=LOG_MAX_BYTES,
+            backupCount=LOG_BACKUP_COUNT,
+            encoding="utf-8"
+        )
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+    if LOG_STDOUT or not handlers:
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+        handlers.append(stream_handler)
+
+    log_queue = queue.SimpleQueue()
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(level or LOG_LEVEL)
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    # Flush everything still queued before the process exits
+    atexit.register(_listener.stop)
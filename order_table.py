@@ -1,38 +1,44 @@
-import mysql.connector
-from datetime import timedelta
+import storage
+from datetime import datetime, timedelta
 import logging
 from dotenv import load_dotenv
 import os
+from bisect import bisect_left
+import daily_summary
+import leases
+import log_setup
+import profiling
+from punch_batch import PunchBatch
 
 load_dotenv("e.env")
 
-DB_CONFIG = {
-    'host': os.getenv("DB_HOST"),
-    'user': os.getenv("DB_USER"),
-    'password': os.getenv("DB_PASS"),
-    'database': os.getenv("DB_NAME")
-}
-
-def get_zoho_logs():
-    conn = mysql.connector.connect(**DB_CONFIG)
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT user_id, timestamp, punch_type FROM attendance_logs WHERE source = 'zoho'")
-    logs = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return logs
+# Only logs this recent are compared, so the queries touch the newest monthly partitions only
+LOOKBACK_DAYS = int(os.getenv("RECONCILE_LOOKBACK_DAYS", "62"))
 
-def get_device_logs():
-    conn = mysql.connector.connect(**DB_CONFIG)
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT id, user_id, timestamp, punch_type, name FROM attendance_logs WHERE source = 'device'")
-    logs = cursor.fetchall()
+# Zoho and device logs for the same punch are considered duplicates within this window
+MATCH_WINDOW_SECONDS = 1800
+
+def get_logs(source, since):
+    # Plain tuples straight into a PunchBatch; row dicts cost an order of magnitude more memory
+    conn = storage.connect()
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT id, user_id, timestamp, punch_type, name FROM attendance_logs WHERE source = %s AND timestamp >= %s",
+        (source, since)
+    )
+    logs = PunchBatch.from_rows(cursor)
     cursor.close()
     conn.close()
     return logs
 
+def get_zoho_logs(since):
+    return get_logs('zoho', since)
+
+def get_device_logs(since):
+    return get_logs('device', since)
+
 def delete_device_log(log_id):
-    conn = mysql.connector.connect(**DB_CONFIG)
+    conn = storage.connect()
     cursor = conn.cursor()
     cursor.execute("DELETE FROM attendance_logs WHERE id = %s", (log_id,))
     conn.commit()
@@ -42,35 +48,56 @@ def delete_device_log(log_id):
 def punch_type_to_str(punch_type):
     return 'Check-In' if punch_type == 0 else 'Check-Out'
 
+def find_zoho_conflicts(device_logs, zoho_logs):
+    """Indices of device logs with a Zoho log of the same user and punch type within 30 minutes."""
+    # Sorted Zoho times per (user, punch type): each device log is one binary search, not a full scan
+    zoho_times = {}
+    for user_id, epoch, punch_type in zip(zoho_logs.user_ids, zoho_logs.timestamps, zoho_logs.punch_types):
+        zoho_times.setdefault((user_id, punch_type), []).append(epoch)
+    for times in zoho_times.values():
+        times.sort()
+
+    conflicts = []
+    for index, (user_id, d_epoch, punch_type) in enumerate(
+        zip(device_logs.user_ids, device_logs.timestamps, device_logs.punch_types)
+    ):
+        times = zoho_times.get((user_id, punch_type))
+        if not times:
+            continue
+        pos = bisect_left(times, d_epoch - MATCH_WINDOW_SECONDS)
+        if pos < len(times) and times[pos] <= d_epoch + MATCH_WINDOW_SECONDS:
+            conflicts.append(index)
+    return conflicts
+
 def main():
-    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    log_setup.configure_logging('order_table.log')
+    with leases.Lease("reconcile") as lease:
+        if lease.acquired:
+            reconcile()
 
+def reconcile():
     logging.info("🔍 Comparing device vs Zoho logs for cleanup...")
 
-    zoho_logs = get_zoho_logs()
-    device_logs = get_device_logs()
+    since = datetime.now() - timedelta(days=LOOKBACK_DAYS)
+    # Zoho logs up to 30 minutes older than the window can still match a device log inside it
+    zoho_logs = get_zoho_logs(since - timedelta(minutes=30))
+    device_logs = get_device_logs(since)
 
     deleted_count = 0
+    deleted = []
 
-    for d_log in device_logs:
-        d_time = d_log['timestamp']
-        d_user = d_log['user_id']
-        d_type = d_log['punch_type']
-
-        for z_log in zoho_logs:
-            if (
-                z_log['user_id'] == d_user and
-                z_log['punch_type'] == d_type and
-                abs((z_log['timestamp'] - d_time).total_seconds()) <= 1800  # within 30 minutes
-            ):
-                punch_type_str = punch_type_to_str(d_type)
-                user_name = d_log.get('name', f'User {d_user}')
-                logging.info(f"🗑️ Removing device log: {user_name}, time {d_time} ({punch_type_str}) - conflict with Zoho")
-                delete_device_log(d_log['id'])
-                deleted_count += 1
-                break  # move to next device log once matched
+    for index in find_zoho_conflicts(device_logs, zoho_logs):
+        d_log = device_logs[index]
+        d_time = d_log.timestamp
+        punch_type_str = punch_type_to_str(d_log.punch_type)
+        user_name = d_log.name or f'User {d_log.user_id}'
+        logging.debug(f"🗑️ Removing device log: {user_name}, time {d_time} ({punch_type_str}) - conflict with Zoho")
+        delete_device_log(d_log.row_id)
+        deleted_count += 1
+        deleted.append((d_log.user_id, d_time))
 
+    daily_summary.refresh_daily_summary(daily_summary.day_keys(deleted))
     logging.info(f"✅ Cleanup complete. {deleted_count} device logs removed due to conflict with Zoho entries.")
 
 if __name__ == "__main__":
-    main()
+    profiling.run_main(main, "order_table")
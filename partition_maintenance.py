@@ -0,0 +1,256 @@
+import os
+import json
+import logging
+import argparse
+from datetime import date, datetime
+import storage
+from dotenv import load_dotenv
+import log_setup
+
+# ===== LOAD ENVIRONMENT VARIABLES =====
+load_dotenv("e.env")
+
+# Tables partitioned by month on `timestamp`
+TABLES = ["attendance_logs", "raw_device_logs", "raw_zoho_logs"]
+
+# Secondary indexes the hot-path queries rely on; created by the migration if missing
+INDEXES = {
+    "attendance_logs": {
+        "idx_source_timestamp": "(`source`, `timestamp`)",
+        "idx_user_timestamp": "(`user_id`, `timestamp`)",
+    },
+    "raw_device_logs": {
+        "idx_user_timestamp": "(`user_id`, `timestamp`)",
+        "idx_timestamp": "(`timestamp`)",
+        "idx_device_timestamp": "(`device_ip`, `timestamp`)",
+    },
+    "raw_zoho_logs": {},
+}
+
+FUTURE_MONTHS = int(os.getenv("PARTITION_FUTURE_MONTHS", "3"))
+ARCHIVE_AFTER_MONTHS = int(os.getenv("ARCHIVE_AFTER_MONTHS", "3"))
+LAST_BACKUP_FILE = "last_backup_time.json"
+BINLOG_CHECKPOINT_FILE = "binlog_checkpoint.json"
+
+# ===== MONTH HELPERS =====
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month):
+    return f"p{month.year:04d}{month.month:02d}"
+
+def partition_month(name):
+    return date(int(name[1:5]), int(name[5:7]), 1)
+
+def partition_clause(month):
+    upper = add_months(month, 1).strftime("%Y-%m-%d")
+    return f"PARTITION {partition_name(month)} VALUES LESS THAN (TO_DAYS('{upper}'))"
+
+# ===== INSPECT EXISTING PARTITIONS =====
+def get_partitions(cursor, table):
+    cursor.execute("""
+        SELECT PARTITION_NAME, TABLE_ROWS
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """, (table,))
+    return cursor.fetchall()
+
+def get_index_names(cursor, table):
+    cursor.execute(f"SHOW INDEX FROM `{table}`")
+    return {row[2] for row in cursor.fetchall()}
+
+# ===== MIGRATE: PARTITION EXISTING TABLES =====
+def migrate_table(cursor, table):
+    existing_indexes = get_index_names(cursor, table)
+    for index_name, columns in INDEXES[table].items():
+        if index_name not in existing_indexes:
+            logging.info(f"🧱 Adding index {index_name} on {table}")
+            cursor.execute(f"ALTER TABLE `{table}` ADD INDEX `{index_name}` {columns}")
+
+    if get_partitions(cursor, table):
+        logging.info(f"ℹ️ {table} is already partitioned.")
+        return
+
+    cursor.execute(f"SELECT MIN(`timestamp`) FROM `{table}`")
+    oldest = cursor.fetchone()[0] or datetime.now()
+    first = month_start(oldest)
+    last = add_months(month_start(datetime.now()), FUTURE_MONTHS)
+
+    months = []
+    month = first
+    while month <= last:
+        months.append(month)
+        month = add_months(month, 1)
+
+    # Every unique key of a partitioned table must include the partitioning column
+    logging.info(f"🔑 Rebuilding primary key of {table} as (id, timestamp)")
+    cursor.execute(f"ALTER TABLE `{table}` DROP PRIMARY KEY, ADD PRIMARY KEY (`id`, `timestamp`)")
+
+    clauses = [partition_clause(m) for m in months] + ["PARTITION pmax VALUES LESS THAN MAXVALUE"]
+    logging.info(f"🗂️ Partitioning {table} into {len(months)} monthly partitions from {partition_name(first)}")
+    cursor.execute(
+        f"ALTER TABLE `{table}` PARTITION BY RANGE (TO_DAYS(`timestamp`)) (\n  "
+        + ",\n  ".join(clauses)
+        + "\n)"
+    )
+
+# ===== MAINTAIN: CREATE FUTURE PARTITIONS =====
+def add_future_partitions(cursor, table):
+    partitions = [name for name, _ in get_partitions(cursor, table)]
+    if not partitions:
+        logging.warning(f"⚠️ {table} is not partitioned; run 'migrate' first.")
+        return 0
+
+    monthly = [partition_month(name) for name in partitions if name != "pmax"]
+    next_month = add_months(max(monthly), 1) if monthly else month_start(datetime.now())
+    target = add_months(month_start(datetime.now()), FUTURE_MONTHS)
+
+    new_months = []
+    while next_month <= target:
+        new_months.append(next_month)
+        next_month = add_months(next_month, 1)
+    if not new_months:
+        return 0
+
+    # pmax is empty as long as maintenance keeps ahead of the clock, so this is a metadata-only split
+    clauses = [partition_clause(m) for m in new_months] + ["PARTITION pmax VALUES LESS THAN MAXVALUE"]
+    cursor.execute(f"ALTER TABLE `{table}` REORGANIZE PARTITION pmax INTO (\n  " + ",\n  ".join(clauses) + "\n)")
+    logging.info(f"➕ Added partitions {', '.join(partition_name(m) for m in new_months)} to {table}")
+    return len(new_months)
+
+# ===== ARCHIVE: DETACH CLOSED PERIODS =====
+def load_last_backup_times():
+    if os.path.exists(LAST_BACKUP_FILE):
+        with open(LAST_BACKUP_FILE, "r") as f:
+            return json.load(f)
+    return {}
+
+def load_binlog_checkpoint():
+    if os.path.exists(BINLOG_CHECKPOINT_FILE):
+        with open(BINLOG_CHECKPOINT_FILE, "r") as f:
+            return json.load(f)
+    return None
+
+def parse_time(value):
+    return datetime.strptime(value[:19], "%Y-%m-%d %H:%M:%S")
+
+def binlog_covers(month, period_end, backed_up_until):
+    """True if every row of the month is in a select backup or a binlog segment.
+
+    Binlog capture must have run past period_end, and started before the
+    month began or before the last select backup, which holds the older rows.
+    """
+    checkpoint = load_binlog_checkpoint()
+    if not checkpoint or "since" not in checkpoint:
+        return False
+    covered_until = datetime.combine(month, datetime.min.time())
+    if backed_up_until:
+        covered_until = max(covered_until, parse_time(backed_up_until))
+    return parse_time(checkpoint["since"]) <= covered_until and parse_time(checkpoint["saved_at"]).date() >= period_end
+
+def archive_partition(cursor, table, name, drop=False, check_backup=True):
+    month = partition_month(name)
+    period_end = add_months(month, 1)
+
+    if check_backup:
+        backed_up_until = load_last_backup_times().get(table)
+        select_covers = backed_up_until and parse_time(backed_up_until).date() >= period_end
+        if not select_covers and not binlog_covers(month, period_end, backed_up_until):
+            cursor.execute(
+                f"SELECT COUNT(*) FROM `{table}` WHERE `timestamp` >= %s AND `timestamp` < %s",
+                (month, period_end)
+            )
+            if cursor.fetchone()[0]:
+                logging.warning(f"⏭️ Skipping {table}.{name}: not fully backed up yet (last backup {backed_up_until})")
+                return False
+
+    if table == "attendance_logs":
+        cursor.execute(
+            "SELECT COUNT(*) FROM attendance_logs WHERE synced = 0 AND `timestamp` >= %s AND `timestamp` < %s",
+            (month, period_end)
+        )
+        if cursor.fetchone()[0]:
+            logging.warning(f"⏭️ Skipping {table}.{name}: it still has logs not synced to Zoho")
+            return False
+
+    archive_table = f"{table}_{name}"
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS `{archive_table}` LIKE `{table}`")
+    # Left over from an earlier run if that run stopped after this point
+    if get_partitions(cursor, archive_table):
+        cursor.execute(f"ALTER TABLE `{archive_table}` REMOVE PARTITIONING")
+    cursor.execute(f"SELECT 1 FROM `{archive_table}` LIMIT 1")
+    if cursor.fetchone():
+        # Exchanging would move those rows back into the live table
+        logging.warning(f"⏭️ Skipping {table}.{name}: {archive_table} already holds rows")
+        return False
+    cursor.execute(f"ALTER TABLE `{table}` EXCHANGE PARTITION `{name}` WITH TABLE `{archive_table}`")
+    cursor.execute(f"ALTER TABLE `{table}` DROP PARTITION `{name}`")
+    if drop:
+        cursor.execute(f"DROP TABLE `{archive_table}`")
+        logging.info(f"🗑️ Dropped closed period {table}.{name}")
+    else:
+        logging.info(f"📦 Detached {table}.{name} into {archive_table}")
+    return True
+
+def archive_closed_periods(cursor, table, before, drop=False, check_backup=True):
+    archived = 0
+    for name, _ in get_partitions(cursor, table):
+        if name == "pmax" or partition_month(name) >= before:
+            continue
+        if archive_partition(cursor, table, name, drop=drop, check_backup=check_backup):
+            archived += 1
+    return archived
+
+# ===== MAIN =====
+def main():
+    parser = argparse.ArgumentParser(description="Monthly partition maintenance for attendance tables")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("migrate", help="partition the tables by month and add hot-path indexes")
+    sub.add_parser("maintain", help=f"create partitions up to {FUTURE_MONTHS} months ahead")
+    archive = sub.add_parser("archive", help="detach closed periods that are already backed up")
+    archive.add_argument("--before", help="first month to keep, YYYY-MM (default: %d months ago)" % ARCHIVE_AFTER_MONTHS)
+    archive.add_argument("--drop", action="store_true", help="drop detached partitions instead of keeping them as tables")
+    archive.add_argument("--skip-backup-check", action="store_true", help="archive months that are not backed up (unsynced months are still skipped)")
+    sub.add_parser("status", help="list partitions and approximate row counts")
+    args = parser.parse_args()
+
+    log_setup.configure_logging('partition_maintenance.log')
+    if storage.DB_BACKEND != "mysql":
+        logging.info(f"ℹ️ Partitioning only applies to MariaDB; nothing to do for DB_BACKEND={storage.DB_BACKEND}.")
+        return
+    conn = None
+    try:
+        conn = storage.connect()
+        cursor = conn.cursor()
+
+        for table in TABLES:
+            if args.command == "migrate":
+                migrate_table(cursor, table)
+            elif args.command == "maintain":
+                add_future_partitions(cursor, table)
+            elif args.command == "archive":
+                if args.before:
+                    before = datetime.strptime(args.before, "%Y-%m").date()
+                else:
+                    before = add_months(month_start(datetime.now()), -ARCHIVE_AFTER_MONTHS)
+                count = archive_closed_periods(cursor, table, before, drop=args.drop, check_backup=not args.skip_backup_check)
+                logging.info(f"✅ {table}: {count} closed periods archived before {before:%Y-%m}")
+            elif args.command == "status":
+                for name, rows in get_partitions(cursor, table) or [("(not partitioned)", None)]:
+                    print(f"{table:<18} {name:<18} {rows if rows is not None else ''}")
+        conn.commit()
+    except storage.Error as err:
+        logging.error(f"❌ Database error during partition {args.command}: {err}")
+        raise SystemExit(1)
+    finally:
+        if conn and conn.is_connected():
+            cursor.close()
+            conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime
+from urllib.parse import urlsplit
+
+# Opt-in profiling for the stage scripts: `python3 <stage>.py --profile`.
+#
+# Writes to PROFILE_DIR/<stage>_<time>.*:
+#   .prof         cProfile data (pstats, snakeviz)
+#   .folded       sampled stacks in folded format (flamegraph.pl, speedscope, inferno)
+#   .calls.jsonl  wall time of every DB statement and HTTP request
+#   .txt          summary report, with EXPLAIN for statements slower than SLOW_QUERY_MS
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+EXPLAIN_LIMIT = 20
+TOP_FUNCTIONS = 25
+
+# ===== CALL RECORDING =====
+class CallLog:
+    def __init__(self):
+        self.calls = []
+        self.slow_statements = {}
+        self.local = threading.local()
+
+    def record(self, kind, key, elapsed, **detail):
+        self.calls.append({"kind": kind, "key": key, "ms": round(elapsed * 1000, 3), **detail})
+
+def statement_key(operation):
+    # Group by statement text; the parameters differ per call
+    return " ".join(str(operation).split())[:200]
+
+def timed_cursor_method(call_log, method):
+    def wrapper(cursor, operation, *args, **kwargs):
+        if getattr(call_log.local, "active", False):
+            # executemany may call execute internally; only the outer call is recorded
+            return method(cursor, operation, *args, **kwargs)
+        call_log.local.active = True
+        start = time.perf_counter()
+        try:
+            return method(cursor, operation, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            call_log.local.active = False
+            key = statement_key(operation)
+            rows = args[0] if method.__name__ == "executemany" and args else None
+            call_log.record("db", key, elapsed, method=method.__name__, rows=len(rows) if rows is not None else None)
+            if elapsed * 1000 >= SLOW_QUERY_MS and key not in call_log.slow_statements:
+                executed = getattr(cursor, "statement", None) or operation
+                call_log.slow_statements[key] = executed if isinstance(executed, str) else executed.decode()
+    wrapper.__wrapped__ = method
+    return wrapper
+
+def timed_http_request(call_log, method):
+    def wrapper(session, http_method, url, *args, **kwargs):
+        start = time.perf_counter()
+        status = None
+        try:
+            response = method(session, http_method, url, *args, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            parts = urlsplit(url)
+            # Query strings carry tokens and dates; group by endpoint
+            call_log.record("http", f"{http_method.upper()} {parts.netloc}{parts.path}", time.perf_counter() - start, status=status)
+    wrapper.__wrapped__ = method
+    return wrapper
+
+def instrument(call_log):
+    """Patch DB cursors and requests to record timings; returns what uninstrument() needs."""
+    cursors = []
+    try:
+        import storage
+        cursors.append(storage.SqliteCursor)
+    except ImportError:
+        pass
+    try:
+        import mysql.connector.cursor as cursor_py
+        cursors.append(cursor_py.MySQLCursor)
+    except ImportError:
+        pass
+    try:
+        import mysql.connector.cursor_cext as cursor_cext
+        cursors.append(cursor_cext.CMySQLCursor)
+    except ImportError:
+        pass
+    patched = []
+    for cls in cursors:
+        for name in ("execute", "executemany"):
+            setattr(cls, name, timed_cursor_method(call_log, getattr(cls, name)))
+            patched.append((cls, name))
+    try:
+        import requests
+        requests.Session.request = timed_http_request(call_log, requests.Session.request)
+        patched.append((requests.Session, "request"))
+    except ImportError:
+        pass
+    return patched
+
+def uninstrument(patched):
+    for cls, name in patched:
+        setattr(cls, name, getattr(cls, name).__wrapped__)
+
+# ===== STACK SAMPLER =====
+class StackSampler(threading.Thread):
+    """Samples the profiled thread's stack every SAMPLE_INTERVAL seconds into folded-stack counts."""
+
+    def __init__(self, thread_id):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.stacks = defaultdict(int)
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def write_folded(self, path):
+        with open(path, "w") as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+
+# ===== EXPLAIN =====
+def explain_statements(statements):
+    """EXPLAIN slow statements on a fresh connection, after the profiled run has finished."""
+    if not statements:
+        return {}
+    try:
+        import storage
+        conn = storage.connect()
+    except Exception as e:
+        return {key: f"EXPLAIN unavailable: {e}" for key in statements}
+    explain = "EXPLAIN QUERY PLAN" if storage.DB_BACKEND == "sqlite" else "EXPLAIN"
+
+    plans = {}
+    cursor = conn.cursor()
+    for key, statement in list(statements.items())[:EXPLAIN_LIMIT]:
+        if statement.lstrip().split(None, 1)[0].upper() not in ("SELECT", "UPDATE", "DELETE"):
+            continue
+        try:
+            cursor.execute(f"{explain} {statement}")
+            columns = [c[0] for c in cursor.description]
+            plans[key] = "\n".join(
+                "    " + ", ".join(f"{c}={v}" for c, v in zip(columns, row) if v is not None)
+                for row in cursor.fetchall()
+            )
+        except Exception as e:
+            plans[key] = f"    EXPLAIN failed: {e}"
+    cursor.close()
+    conn.close()
+    return plans
+
+# ===== REPORT =====
+def summarise_calls(calls, kind):
+    groups = defaultdict(list)
+    for call in calls:
+        if call["kind"] == kind:
+            groups[call["key"]].append(call["ms"])
+    lines = []
+    for key, times in sorted(groups.items(), key=lambda item: -sum(item[1])):
+        lines.append(
+            f"  {sum(times):10.1f} ms  {len(times):6d} calls  mean {sum(times) / len(times):8.2f}  "
+            f"max {max(times):8.2f}  {key}"
+        )
+    total = sum(call["ms"] for call in calls if call["kind"] == kind)
+    return total, lines
+
+def write_report(path, stage, wall, profile, call_log, plans):
+    db_total, db_lines = summarise_calls(call_log.calls, "db")
+    http_total, http_lines = summarise_calls(call_log.calls, "http")
+    with open(path, "w") as f:
+        f.write(f"Profile of {stage} at {datetime.now():%Y-%m-%d %H:%M:%S}\n")
+        f.write(f"Wall time: {wall:.3f} s  |  DB: {db_total / 1000:.3f} s  |  HTTP: {http_total / 1000:.3f} s  |  "
+                f"other (device, CPU): {max(0.0, wall - (db_total + http_total) / 1000):.3f} s\n\n")
+        f.write("== DB statements by total time ==\n")
+        f.write("\n".join(db_lines or ["  (none)"]) + "\n\n")
+        f.write("== HTTP requests by total time ==\n")
+        f.write("\n".join(http_lines or ["  (none)"]) + "\n\n")
+        f.write(f"== Statements over {SLOW_QUERY_MS:g} ms ==\n")
+        if not call_log.slow_statements:
+            f.write("  (none)\n")
+        for key, statement in call_log.slow_statements.items():
+            f.write(f"  {statement[:500]}\n{plans.get(key, '    (no plan)')}\n")
+        f.write(f"\n== Top {TOP_FUNCTIONS} functions by cumulative time ==\n")
+        stats = pstats.Stats(profile, stream=f)
+        stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+
+# ===== ENTRY POINT =====
+def run_main(main, stage):
+    """Run main(); with --profile on the command line, profile it and write the report."""
+    if "--profile" not in sys.argv:
+        return main()
+    sys.argv.remove("--profile")
+
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, f"{stage}_{datetime.now():%Y%m%d_%H%M%S}")
+    call_log = CallLog()
+    patched = instrument(call_log)
+    sampler = StackSampler(threading.get_ident())
+    profile = cProfile.Profile()
+
+    sampler.start()
+    start = time.perf_counter()
+    profile.enable()
+    try:
+        return main()
+    finally:
+        profile.disable()
+        wall = time.perf_counter() - start
+        sampler.stop()
+        # The EXPLAINs below are not part of the stage
+        uninstrument(patched)
+
+        profile.dump_stats(f"{base}.prof")
+        sampler.write_folded(f"{base}.folded")
+        with open(f"{base}.calls.jsonl", "w") as f:
+            for call in call_log.calls:
+                f.write(json.dumps(call) + "\n")
+        write_report(f"{base}.txt", stage, wall, profile, call_log, explain_statements(call_log.slow_statements))
+        logging.info(f"📊 Profile of {stage} ({wall:.2f}s) written to {base}.txt / .prof / .folded")
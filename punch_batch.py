@@ -0,0 +1,143 @@
+from array import array
+from datetime import datetime, timedelta
+
+# Compact, column-oriented punch storage shared by ingest, reconciliation and sync.
+#
+# A list of per-punch dicts costs several hundred bytes per punch; here a punch
+# is ~31 bytes spread over typed arrays: epoch-second timestamps, interned
+# device IP and name ids, and a 1-byte punch type.
+
+EPOCH = datetime(1970, 1, 1)
+CHECK_IN = 0
+CHECK_OUT = 1
+UNKNOWN = 255
+STATUS_NAMES = {CHECK_IN: 'Check-In', CHECK_OUT: 'Check-Out'}
+
+
+def to_epoch(timestamp):
+    # Naive local datetimes are stored as if UTC so the round trip is exact across DST changes
+    return (timestamp - EPOCH) // timedelta(seconds=1)
+
+
+def from_epoch(seconds):
+    return EPOCH + timedelta(seconds=seconds)
+
+
+class Punch:
+    """Read-only view of one row of a PunchBatch."""
+    __slots__ = ('batch', 'index')
+
+    def __init__(self, batch, index):
+        self.batch = batch
+        self.index = index
+
+    @property
+    def user_id(self):
+        return self.batch.user_ids[self.index]
+
+    @property
+    def epoch(self):
+        return self.batch.timestamps[self.index]
+
+    @property
+    def timestamp(self):
+        return from_epoch(self.batch.timestamps[self.index])
+
+    @property
+    def punch_type(self):
+        return self.batch.punch_types[self.index]
+
+    @property
+    def status(self):
+        return STATUS_NAMES.get(self.punch_type)
+
+    @property
+    def name(self):
+        return self.batch.names[self.batch.name_ids[self.index]]
+
+    @property
+    def device_ip(self):
+        return self.batch.devices[self.batch.device_ids[self.index]]
+
+    @property
+    def row_id(self):
+        return self.batch.row_ids[self.index]
+
+
+class PunchBatch:
+    __slots__ = (
+        'user_ids', 'timestamps', 'punch_types', 'device_ids', 'name_ids', 'row_ids',
+        'devices', 'names', '_device_index', '_name_index'
+    )
+
+    def __init__(self, devices=None, names=None):
+        self.user_ids = array('q')
+        self.timestamps = array('q')
+        self.punch_types = array('B')
+        self.device_ids = array('H')
+        self.name_ids = array('I')
+        self.row_ids = array('q')
+        # Interned strings; index 0 is always None so "unknown" costs nothing
+        self.devices = devices if devices is not None else [None]
+        self.names = names if names is not None else [None]
+        self._device_index = {v: i for i, v in enumerate(self.devices)}
+        self._name_index = {v: i for i, v in enumerate(self.names)}
+
+    # ===== BUILDING =====
+    def _intern(self, table, index, value):
+        i = index.get(value)
+        if i is None:
+            i = index[value] = len(table)
+            table.append(value)
+        return i
+
+    def append(self, user_id, timestamp, punch_type=UNKNOWN, name=None, device_ip=None, row_id=0):
+        self.user_ids.append(int(user_id))
+        self.timestamps.append(to_epoch(timestamp) if isinstance(timestamp, datetime) else int(timestamp))
+        self.punch_types.append(punch_type)
+        self.device_ids.append(self._intern(self.devices, self._device_index, device_ip))
+        self.name_ids.append(self._intern(self.names, self._name_index, name))
+        self.row_ids.append(row_id)
+
+    @classmethod
+    def from_attendance(cls, attendance, user_map, device_ip):
+        """Build from pyzk Attendance objects; user_map maps device user_id to name."""
+        batch = cls()
+        device_id = batch._intern(batch.devices, batch._device_index, device_ip)
+        for log in attendance:
+            batch.user_ids.append(int(log.user_id))
+            batch.timestamps.append(to_epoch(log.timestamp))
+            batch.punch_types.append(UNKNOWN)
+            batch.device_ids.append(device_id)
+            batch.name_ids.append(batch._intern(batch.names, batch._name_index, user_map.get(log.user_id, "Unknown")))
+            batch.row_ids.append(0)
+        return batch
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from (id, user_id, timestamp, punch_type, name) tuples as returned by a plain cursor."""
+        batch = cls()
+        for row_id, user_id, timestamp, punch_type, name in rows:
+            batch.append(user_id, timestamp, punch_type, name, row_id=row_id)
+        return batch
+
+    # ===== ACCESS =====
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __iter__(self):
+        return (Punch(self, i) for i in range(len(self)))
+
+    def __getitem__(self, index):
+        return Punch(self, index)
+
+    def take(self, indices):
+        """New batch with the given rows, in that order, sharing the intern tables."""
+        batch = PunchBatch(self.devices, self.names)
+        for column in PunchBatch.__slots__[:6]:
+            source = getattr(self, column)
+            getattr(batch, column).extend(source[i] for i in indices)
+        return batch
+
+    def filter(self, predicate):
+        return self.take([i for i in range(len(self)) if predicate(i)])
@@ -0,0 +1,268 @@
+import os
+import json
+import hashlib
+import logging
+import argparse
+import time
+from contextlib import ExitStack
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+import storage
+from dotenv import load_dotenv
+import daily_summary
+import leases
+import log_setup
+from order_table import find_zoho_conflicts, MATCH_WINDOW_SECONDS
+from punch_batch import PunchBatch, CHECK_IN, CHECK_OUT, STATUS_NAMES, to_epoch
+from sync_to_zoho import SYNC_SHARDS
+
+# ===== LOAD ENVIRONMENT VARIABLES =====
+load_dotenv("e.env")
+
+CHECKPOINT_FILE = "replay_checkpoint.json"
+# Every job that writes attendance_logs. A replay holds all of their leases, so none of them
+# runs between a user's reads and the rewrite (a drained row would be deleted, a push repeated).
+INGEST_LEASES = ["drain", "reconcile", "zoho-import"] + [f"sync:{shard}/{SYNC_SHARDS}" for shard in range(SYNC_SHARDS)]
+LEASE_RETRY_SECONDS = 5
+
+# ===== CHECKPOINT =====
+def run_key(date_from, date_to, user_ids):
+    users = ",".join(str(u) for u in sorted(user_ids)) if user_ids else "all"
+    return hashlib.sha256(f"{date_from}|{date_to}|{users}".encode()).hexdigest()[:16]
+
+def load_checkpoint(path, key):
+    if os.path.exists(path):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get("run") == key:
+            return set(data.get("done", []))
+    return set()
+
+def save_checkpoint(path, key, done):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"run": key, "done": sorted(done), "updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}, f)
+    os.replace(tmp_path, path)
+
+# ===== LEASES =====
+def hold_ingest_leases(stack, wait):
+    """Enter all INGEST_LEASES on stack, retrying for up to wait seconds. Returns the leases or None."""
+    deadline = time.monotonic() + wait
+    while True:
+        with ExitStack() as attempt:
+            held = [attempt.enter_context(leases.Lease(resource)) for resource in INGEST_LEASES]
+            if all(lease.acquired for lease in held):
+                stack.enter_context(attempt.pop_all())
+                return held
+        # Partial sets are released above, so two replays cannot block each other for good
+        if time.monotonic() >= deadline:
+            return None
+        time.sleep(LEASE_RETRY_SECONDS)
+
+# ===== USERS TO REPLAY =====
+def get_users_in_range(start, end):
+    conn = storage.connect()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT user_id FROM raw_device_logs WHERE timestamp >= %s AND timestamp < %s
+        UNION
+        SELECT user_id FROM raw_zoho_logs WHERE timestamp >= %s AND timestamp < %s
+    """, (start, end, start, end))
+    users = sorted(row[0] for row in cursor.fetchall())
+    cursor.close()
+    conn.close()
+    return users
+
+# ===== REBUILD ONE USER =====
+def replay_user(user_id, start, end, dry_run=False):
+    """Rebuild attendance_logs for one user in [start, end) from the raw tables in one transaction."""
+    conn = storage.connect()
+    cursor = conn.cursor()
+    try:
+        if storage.DB_BACKEND == "sqlite" and not dry_run:
+            # Leases do not exclude processes on one box; take the write lock before reading instead
+            cursor.execute("BEGIN IMMEDIATE")
+        # Status before the range seeds the alternation, as live ingest seeds it from the latest attendance_logs row
+        cursor.execute(
+            "SELECT punch_type FROM attendance_logs WHERE user_id = %s AND timestamp < %s ORDER BY timestamp DESC LIMIT 1",
+            (user_id, start)
+        )
+        row = cursor.fetchone()
+        last_type = row[0] if row else None
+
+        window = timedelta(seconds=MATCH_WINDOW_SECONDS)
+        cursor.execute("""
+            SELECT id, user_id, timestamp, punch_type, name FROM raw_zoho_logs
+            WHERE user_id = %s AND timestamp >= %s AND timestamp < %s
+            ORDER BY timestamp
+        """, (user_id, start - window, end + window))
+        zoho = PunchBatch.from_rows(cursor.fetchall())
+
+        cursor.execute("""
+            SELECT id, timestamp, status, name, device_ip FROM raw_device_logs
+            WHERE user_id = %s AND timestamp >= %s AND timestamp < %s
+            ORDER BY timestamp, id
+        """, (user_id, start, end))
+        device = PunchBatch()
+        raw_ids = []
+        old_status = []
+        last_epoch = None
+        # Zoho punches are part of the timeline too: live ingest continues from a Zoho row when it is the latest
+        start_epoch = to_epoch(start)
+        next_zoho = 0
+        while next_zoho < len(zoho) and zoho.timestamps[next_zoho] < start_epoch:
+            next_zoho += 1
+        for raw_id, timestamp, status, name, device_ip in cursor.fetchall():
+            device.append(user_id, timestamp, name=name, device_ip=device_ip, row_id=raw_id)
+            while next_zoho < len(zoho) and zoho.timestamps[next_zoho] < device.timestamps[-1]:
+                last_type = zoho.punch_types[next_zoho]
+                next_zoho += 1
+            if device.timestamps[-1] == last_epoch:
+                # Same punch seen twice (e.g. two polls of one device); the status applies once
+                device.punch_types[-1] = device.punch_types[-2]
+            else:
+                last_type = CHECK_OUT if last_type == CHECK_IN else CHECK_IN
+                device.punch_types[-1] = last_type
+                last_epoch = device.timestamps[-1]
+            raw_ids.append(raw_id)
+            old_status.append(status)
+
+        # Keep the synced flag of rows that survive unchanged so they are not pushed again
+        cursor.execute("""
+            SELECT timestamp, punch_type, source, synced FROM attendance_logs
+            WHERE user_id = %s AND timestamp >= %s AND timestamp < %s
+        """, (user_id, start, end))
+        previous = {(ts, punch_type, source): synced for ts, punch_type, source, synced in cursor.fetchall()}
+
+        conflicts = set(find_zoho_conflicts(device, zoho))
+        rows = []
+        seen = set()
+        for index, punch in enumerate(device):
+            key = (punch.timestamp, punch.punch_type, 'device')
+            if index in conflicts or key in seen:
+                continue
+            seen.add(key)
+            rows.append((user_id, punch.name, punch.timestamp, punch.punch_type, previous.get(key, 0), 'device'))
+        for punch in zoho:
+            if start <= punch.timestamp < end:
+                rows.append((user_id, punch.name, punch.timestamp, punch.punch_type, 1, 'zoho'))
+
+        status_updates = [
+            (STATUS_NAMES[device.punch_types[i]], raw_ids[i])
+            for i in range(len(device))
+            if STATUS_NAMES[device.punch_types[i]] != old_status[i]
+        ]
+        stats = {
+            "user_id": user_id,
+            "device_punches": len(device),
+            "zoho_punches": len(zoho),
+            "status_changes": len(status_updates),
+            "zoho_duplicates": len(conflicts),
+            "rows": len(rows),
+            # attendance_logs rows added or removed; 0 when the range was already consistent
+            "changed_rows": len({(row[2], row[3], row[5]) for row in rows} ^ set(previous)),
+        }
+        if dry_run:
+            conn.rollback()
+            return stats
+
+        cursor.execute(
+            "DELETE FROM attendance_logs WHERE user_id = %s AND timestamp >= %s AND timestamp < %s",
+            (user_id, start, end)
+        )
+        if rows:
+            cursor.executemany("""
+                INSERT INTO attendance_logs (user_id, name, timestamp, punch_type, synced, source)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, rows)
+        if status_updates:
+            cursor.executemany("UPDATE raw_device_logs SET status = %s WHERE id = %s", status_updates)
+
+        days = {(user_id, ts.date()) for ts, _, _ in previous}
+        days.update((user_id, row[2].date()) for row in rows)
+        daily_summary.refresh_summary(cursor, days)
+        conn.commit()
+        return stats
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+# ===== MAIN =====
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild attendance_logs from raw_device_logs/raw_zoho_logs")
+    parser.add_argument("--from", dest="date_from", required=True, help="first day, YYYY-MM-DD")
+    parser.add_argument("--to", dest="date_to", required=True, help="last day, YYYY-MM-DD (inclusive)")
+    parser.add_argument("--users", help="comma-separated device user IDs (default: everyone with punches in range)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="parallel worker processes")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE, help="resume file")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument("--dry-run", action="store_true", help="compute and report changes without writing")
+    parser.add_argument("--check", action="store_true", help="dry run that exits with status 1 if anything would change")
+    parser.add_argument("--lease-wait", type=int, default=600, help="seconds to wait for running ingest jobs to finish")
+    args = parser.parse_args()
+    args.dry_run = args.dry_run or args.check
+
+    log_setup.configure_logging('replay.log')
+    start = datetime.strptime(args.date_from, "%Y-%m-%d")
+    end = datetime.strptime(args.date_to, "%Y-%m-%d") + timedelta(days=1)
+    requested = [int(u) for u in args.users.split(",") if u.strip()] if args.users else None
+
+    key = run_key(args.date_from, args.date_to, requested)
+    done = set() if args.restart or args.dry_run else load_checkpoint(args.checkpoint, key)
+    users = requested or get_users_in_range(start, end)
+    pending = [u for u in users if u not in done]
+    logging.info(
+        f"🔁 Replaying {args.date_from}..{args.date_to}: {len(users)} users, "
+        f"{len(done)} already done, {len(pending)} to go, {args.workers} workers"
+    )
+
+    totals = {"device_punches": 0, "status_changes": 0, "zoho_duplicates": 0, "rows": 0, "changed_rows": 0}
+    failed = []
+    with ExitStack() as stack:
+        # A dry run only reads, so live ingest keeps running during --check
+        held = [] if args.dry_run else hold_ingest_leases(stack, args.lease_wait)
+        if held is None:
+            logging.error(f"❌ Ingest jobs still running after {args.lease_wait}s; replay not started")
+            raise SystemExit(1)
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            futures = {pool.submit(replay_user, user_id, start, end, args.dry_run): user_id for user_id in pending}
+            for completed, future in enumerate(as_completed(futures), 1):
+                user_id = futures[future]
+                if any(lease.lost for lease in held):
+                    # Ingest may run again; users not yet replayed are left for the next run
+                    pool.shutdown(cancel_futures=True)
+                    logging.error("❌ Lost an ingest lease; stopping the replay")
+                    raise SystemExit(1)
+                try:
+                    stats = future.result()
+                except Exception as e:
+                    logging.error(f"❌ User {user_id} failed, will be retried on the next run: {e}")
+                    failed.append(user_id)
+                    continue
+                for name in totals:
+                    totals[name] += stats[name]
+                if not args.dry_run:
+                    done.add(user_id)
+                    save_checkpoint(args.checkpoint, key, done)
+                logging.info(
+                    f"[{completed}/{len(pending)}] User {user_id}: {stats['device_punches']} device punches, "
+                    f"{stats['status_changes']} status changes, {stats['zoho_duplicates']} Zoho duplicates, "
+                    f"{stats['rows']} rows, {stats['changed_rows']} changed"
+                )
+
+    logging.info(
+        f"✅ Replay {'dry run ' if args.dry_run else ''}complete: {totals['device_punches']} device punches, "
+        f"{totals['status_changes']} status changes, {totals['zoho_duplicates']} Zoho duplicates, "
+        f"{totals['rows']} attendance rows, {totals['changed_rows']} changed, {len(failed)} users failed"
+    )
+    if failed:
+        raise SystemExit(1)
+    if args.check and (totals["status_changes"] or totals["changed_rows"]):
+        logging.warning("⚠️ Replay would change attendance_logs or raw_device_logs.status in this range")
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,12 @@
+import os
+import sys
+import time
 import subprocess
 import logging
+from datetime import datetime
+import log_setup
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+log_setup.configure_logging('run_all.log')
 
 scripts = [
     ("insert_log_to_db.py", True),   # Must always run
@@ -11,10 +15,20 @@ scripts = [
     ("sync_to_zoho.py", False)
 ]
 
+# --profile: every stage writes its profile into one directory for this cycle
+profile = "--profile" in sys.argv[1:]
+env = os.environ.copy()
+if profile:
+    profile_dir = os.path.join(os.getenv("PROFILE_DIR", "profiles"), f"run_all_{datetime.now():%Y%m%d_%H%M%S}")
+    os.makedirs(profile_dir, exist_ok=True)
+    env["PROFILE_DIR"] = profile_dir
+
+stage_times = []
 for script, must_run in scripts:
+    start = time.perf_counter()
     try:
         logging.info(f"Running: {script}")
-        subprocess.run(["python3", script], check=True)
+        subprocess.run(["python3", script] + (["--profile"] if profile else []), check=True, env=env)
         logging.info(f"Completed: {script}")
     except subprocess.CalledProcessError as e:
         logging.error(f"Error running {script}: {e}")
@@ -23,3 +37,18 @@ for script, must_run in scripts:
         else:
             logging.warning(f"Stopping sequence due to error in optional script: {script}")
             break
+    finally:
+        stage_times.append((script, time.perf_counter() - start))
+
+if profile:
+    # One flame graph for the whole cycle: each stage's stacks under its script name
+    with open(os.path.join(profile_dir, "run_all.folded"), "w") as combined:
+        for name in sorted(os.listdir(profile_dir)):
+            if name.endswith(".folded") and name != "run_all.folded":
+                stage = name.rsplit("_", 2)[0]
+                with open(os.path.join(profile_dir, name)) as f:
+                    for line in f:
+                        combined.write(f"{stage};{line}")
+    for script, seconds in stage_times:
+        logging.info(f"📊 {script}: {seconds:.2f}s")
+    logging.info(f"📊 Cycle total {sum(s for _, s in stage_times):.2f}s, profiles in {profile_dir}")
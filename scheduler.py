@@ -0,0 +1,184 @@
+import os
+import sys
+import time
+import logging
+import argparse
+import subprocess
+from datetime import datetime, timedelta
+import storage
+from dotenv import load_dotenv
+import device_spool
+import leases
+import log_setup
+
+# ===== LOAD ENVIRONMENT VARIABLES =====
+load_dotenv("e.env")
+
+DEVICE_IPS = [ip.strip() for ip in os.getenv("DEVICE_IPS", os.getenv("DEVICE_IP", "")).split(",") if ip.strip()]
+
+# Poll intervals in seconds: tight inside shift windows, backing off towards the maximum while idle
+POLL_MIN_SECONDS = int(os.getenv("POLL_MIN_SECONDS", "60"))
+POLL_BASE_SECONDS = int(os.getenv("POLL_BASE_SECONDS", "300"))
+POLL_MAX_SECONDS = int(os.getenv("POLL_MAX_SECONDS", "1800"))
+POLL_BACKOFF = float(os.getenv("POLL_BACKOFF", "1.5"))
+
+# e.g. "07:30-09:30,16:30-18:30" on SHIFT_DAYS (mon..sun)
+SHIFT_WINDOWS = os.getenv("SHIFT_WINDOWS", "")
+SHIFT_DAYS = os.getenv("SHIFT_DAYS", "mon,tue,wed,thu,fri")
+
+# Zoho import runs before every sync, and at least this often to pick up edits made in Zoho
+ZOHO_IMPORT_MAX_SECONDS = int(os.getenv("ZOHO_IMPORT_MAX_SECONDS", "1800"))
+# Unsynced rows that did not change (e.g. employees missing in Zoho) are retried this often
+SYNC_RETRY_SECONDS = int(os.getenv("SYNC_RETRY_SECONDS", "1800"))
+
+DAY_NAMES = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+# ===== SHIFT WINDOWS =====
+def parse_shift_windows(spec, days_spec):
+    days = {DAY_NAMES.index(d.strip().lower()[:3]) for d in days_spec.split(",") if d.strip()}
+    windows = []
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        start, end = part.strip().split("-")
+        windows.append((
+            datetime.strptime(start, "%H:%M").time(),
+            datetime.strptime(end, "%H:%M").time()
+        ))
+    return days, windows
+
+def in_shift_window(moment, days, windows):
+    if moment.weekday() not in days:
+        return False
+    return any(start <= moment.time() < end for start, end in windows)
+
+def next_shift_start(moment, days, windows):
+    """Earliest shift window start after moment, within the next week."""
+    for offset in range(8):
+        day = (moment + timedelta(days=offset)).date()
+        if day.weekday() not in days:
+            continue
+        for start, _ in sorted(windows):
+            candidate = datetime.combine(day, start)
+            if candidate > moment:
+                return candidate
+    return None
+
+# ===== PER-DEVICE POLL STATE =====
+class DevicePoller:
+    def __init__(self, ip):
+        self.ip = ip
+        self.interval = POLL_BASE_SECONDS
+        self.next_poll = datetime.now()
+
+    def schedule(self, new_punches, now, days, windows):
+        if in_shift_window(now, days, windows):
+            self.interval = POLL_MIN_SECONDS
+        elif new_punches:
+            # Activity outside a shift: the more punches, the tighter the next poll
+            self.interval = max(POLL_MIN_SECONDS, min(self.interval, POLL_BASE_SECONDS // (1 + new_punches)))
+        else:
+            self.interval = min(POLL_MAX_SECONDS, int(self.interval * POLL_BACKOFF))
+
+        next_poll = now + timedelta(seconds=self.interval)
+        # Never sleep through the start of a shift
+        shift_start = next_shift_start(now, days, windows)
+        if shift_start and shift_start < next_poll:
+            next_poll = shift_start
+        self.next_poll = next_poll
+
+# ===== RUN A STAGE =====
+def run_stage(script, *args):
+    command = [sys.executable, script, *args]
+    logging.info(f"Running: {' '.join(command[1:])}")
+    result = subprocess.run(command)
+    if result.returncode != 0:
+        logging.error(f"Error running {script}: exit code {result.returncode}")
+    return result.returncode == 0
+
+def count_unsynced():
+    try:
+        conn = storage.connect()
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM attendance_logs WHERE synced = 0")
+        count = cursor.fetchone()[0]
+        cursor.close()
+        conn.close()
+        return count
+    except storage.Error as err:
+        logging.error(f"❌ Database error counting unsynced logs: {err}")
+        return None
+
+# ===== MAIN LOOP =====
+def main():
+    parser = argparse.ArgumentParser(description="Activity-adaptive poller for ZKTeco devices and Zoho sync")
+    parser.add_argument("--once", action="store_true", help="run a single scheduling pass and exit")
+    args = parser.parse_args()
+
+    log_setup.configure_logging('scheduler.log')
+    if not DEVICE_IPS:
+        logging.error("🚫 No devices configured; set DEVICE_IPS or DEVICE_IP.")
+        raise SystemExit(1)
+
+    days, windows = parse_shift_windows(SHIFT_WINDOWS, SHIFT_DAYS)
+    pollers = {ip: DevicePoller(ip) for ip in DEVICE_IPS}
+    # Nodes listing the same devices split them between themselves through device leases
+    keeper = leases.LeaseKeeper()
+    last_import = datetime.min
+    last_sync = datetime.min
+    last_unsynced = None
+    logging.info(
+        f"⏲️ Node {leases.NODE_ID} scheduling up to {len(pollers)} devices, shift windows: {SHIFT_WINDOWS or 'none'}"
+    )
+
+    while True:
+        owned = [pollers[ip] for ip in keeper.balance_devices(DEVICE_IPS)]
+        now = datetime.now()
+
+        # Poll owned devices that are due; collection only touches the device and the local spool
+        for poller in owned:
+            if poller.next_poll > now:
+                continue
+            before = device_spool.appended_count(poller.ip)
+            run_stage("insert_log_to_db.py", "--collect-only", "--device-ip", poller.ip)
+            new_punches = device_spool.appended_count(poller.ip) - before
+            poller.schedule(new_punches, datetime.now(), days, windows)
+            logging.info(
+                f"📟 {poller.ip}: {new_punches} new punches, next poll in {poller.interval}s "
+                f"at {poller.next_poll:%H:%M:%S}"
+            )
+
+        # Work-triggered stages
+        if device_spool.has_pending():
+            run_stage("insert_log_to_db.py", "--drain-only")
+
+        now = datetime.now()
+        unsynced = count_unsynced()
+        sync_due = bool(unsynced) and (
+            unsynced != last_unsynced or (now - last_sync).total_seconds() >= SYNC_RETRY_SECONDS
+        )
+        import_due = sync_due or (now - last_import).total_seconds() >= ZOHO_IMPORT_MAX_SECONDS
+
+        if import_due:
+            # A failed import is retried with the next sync or after ZOHO_IMPORT_MAX_SECONDS
+            run_stage("zoholog_to_db.py")
+            last_import = now
+        if sync_due:
+            if run_stage("order_table.py"):
+                run_stage("sync_to_zoho.py")
+            last_sync = now
+            last_unsynced = count_unsynced()
+
+        if args.once:
+            keeper.close()
+            return
+
+        # Wake within a lease TTL to take over devices of a node that died
+        wake_at = datetime.now() + timedelta(seconds=leases.LEASE_TTL_SECONDS)
+        wake_at = min([wake_at] + [p.next_poll for p in owned])
+        wake_at = min(wake_at, last_import + timedelta(seconds=ZOHO_IMPORT_MAX_SECONDS))
+        sleep_seconds = max(1.0, (wake_at - datetime.now()).total_seconds())
+        time.sleep(sleep_seconds)
+
+if __name__ == "__main__":
+    main()
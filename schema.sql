@@ -46,3 +46,55 @@ CREATE TABLE IF NOT EXISTS `raw_zoho_logs` (
   PRIMARY KEY (`id`),
   UNIQUE KEY `unique_user_time` (`user_id`,`timestamp`,`punch_type`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- ------------------------------------------------------
+-- Table: user_mapping
+-- ------------------------------------------------------
+CREATE TABLE IF NOT EXISTS `user_mapping` (
+  `zoho_emp_id` varchar(50) NOT NULL,
+  `zk_user_id` int(11) NOT NULL,
+  PRIMARY KEY (`zoho_emp_id`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- ------------------------------------------------------
+-- Table: daily_attendance_summary
+-- Maintained incrementally by daily_summary.refresh_summary()
+-- ------------------------------------------------------
+CREATE TABLE IF NOT EXISTS `daily_attendance_summary` (
+  `user_id` int(11) NOT NULL,
+  `work_date` date NOT NULL,
+  `name` varchar(100) DEFAULT NULL,
+  `first_in` datetime DEFAULT NULL,
+  `last_out` datetime DEFAULT NULL,
+  `punch_count` int(11) NOT NULL DEFAULT 0,
+  `worked_seconds` int(11) NOT NULL DEFAULT 0,
+  `updated_at` timestamp NOT NULL DEFAULT current_timestamp() ON UPDATE current_timestamp(),
+  PRIMARY KEY (`user_id`,`work_date`),
+  KEY `idx_work_date` (`work_date`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- ------------------------------------------------------
+-- Table: zoho_day_digests
+-- Hash of each (employee, day) attEntries already imported by zoholog_to_db.py
+-- ------------------------------------------------------
+CREATE TABLE IF NOT EXISTS `zoho_day_digests` (
+  `emp_id` varchar(50) NOT NULL,
+  `day_key` varchar(20) NOT NULL,
+  `digest` char(64) NOT NULL,
+  `updated_at` timestamp NOT NULL DEFAULT current_timestamp() ON UPDATE current_timestamp(),
+  PRIMARY KEY (`emp_id`,`day_key`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- ------------------------------------------------------
+-- Table: collector_leases
+-- Devices and work shards owned by one collector node at a time (leases.py)
+-- ------------------------------------------------------
+CREATE TABLE IF NOT EXISTS `collector_leases` (
+  `resource` varchar(100) NOT NULL,
+  `owner` varchar(100) NOT NULL,
+  `acquired_at` datetime NOT NULL,
+  `heartbeat_at` datetime NOT NULL,
+  `expires_at` datetime NOT NULL,
+  PRIMARY KEY (`resource`),
+  KEY `idx_owner` (`owner`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
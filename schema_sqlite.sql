@@ -0,0 +1,98 @@
+-- ZKTeco → Zoho Attendance Integration
+-- SQLite schema (DB_BACKEND=sqlite), equivalent to schema.sql
+-- Created automatically by storage.connect() on first use
+
+PRAGMA journal_mode=WAL;
+
+-- ------------------------------------------------------
+-- Table: attendance_logs
+-- ------------------------------------------------------
+CREATE TABLE IF NOT EXISTS attendance_logs (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  user_id INTEGER NOT NULL,
+  name TEXT,
+  timestamp DATETIME NOT NULL,
+  punch_type INTEGER NOT NULL,
+  synced INTEGER DEFAULT 0,
+  source TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_attendance_source_timestamp ON attendance_logs (source, timestamp);
+CREATE INDEX IF NOT EXISTS idx_attendance_user_timestamp ON attendance_logs (user_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_attendance_unsynced ON attendance_logs (synced) WHERE synced = 0;
+
+-- ------------------------------------------------------
+-- Table: raw_device_logs
+-- ------------------------------------------------------
+CREATE TABLE IF NOT EXISTS raw_device_logs (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  user_id INTEGER NOT NULL,
+  name TEXT,
+  timestamp DATETIME NOT NULL,
+  status TEXT NOT NULL CHECK (status IN ('Check-In', 'Check-Out')),
+  device_ip TEXT,
+  created_at DATETIME DEFAULT (datetime('now', 'localtime'))
+);
+CREATE INDEX IF NOT EXISTS idx_raw_device_user_timestamp ON raw_device_logs (user_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_raw_device_timestamp ON raw_device_logs (timestamp);
+CREATE INDEX IF NOT EXISTS idx_raw_device_device_timestamp ON raw_device_logs (device_ip, timestamp);
+
+-- ------------------------------------------------------
+-- Table: raw_zoho_logs
+-- ------------------------------------------------------
+CREATE TABLE IF NOT EXISTS raw_zoho_logs (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  user_id INTEGER NOT NULL,
+  name TEXT NOT NULL,
+  timestamp DATETIME NOT NULL,
+  punch_type INTEGER NOT NULL,
+  source TEXT DEFAULT 'zoho',
+  inserted_at DATETIME DEFAULT (datetime('now', 'localtime')),
+  UNIQUE (user_id, timestamp, punch_type)
+);
+
+-- ------------------------------------------------------
+-- Table: user_mapping
+-- ------------------------------------------------------
+CREATE TABLE IF NOT EXISTS user_mapping (
+  zoho_emp_id TEXT PRIMARY KEY,
+  zk_user_id INTEGER NOT NULL
+);
+
+-- ------------------------------------------------------
+-- Table: daily_attendance_summary
+-- ------------------------------------------------------
+CREATE TABLE IF NOT EXISTS daily_attendance_summary (
+  user_id INTEGER NOT NULL,
+  work_date DATE NOT NULL,
+  name TEXT,
+  first_in DATETIME,
+  last_out DATETIME,
+  punch_count INTEGER NOT NULL DEFAULT 0,
+  worked_seconds INTEGER NOT NULL DEFAULT 0,
+  updated_at DATETIME DEFAULT (datetime('now', 'localtime')),
+  PRIMARY KEY (user_id, work_date)
+);
+CREATE INDEX IF NOT EXISTS idx_summary_work_date ON daily_attendance_summary (work_date);
+
+-- ------------------------------------------------------
+-- Table: zoho_day_digests
+-- ------------------------------------------------------
+CREATE TABLE IF NOT EXISTS zoho_day_digests (
+  emp_id TEXT NOT NULL,
+  day_key TEXT NOT NULL,
+  digest TEXT NOT NULL,
+  updated_at DATETIME DEFAULT (datetime('now', 'localtime')),
+  PRIMARY KEY (emp_id, day_key)
+);
+
+-- ------------------------------------------------------
+-- Table: collector_leases
+-- Unused with SQLite (a single box needs no coordination); kept for schema parity
+-- ------------------------------------------------------
+CREATE TABLE IF NOT EXISTS collector_leases (
+  resource TEXT PRIMARY KEY,
+  owner TEXT NOT NULL,
+  acquired_at DATETIME NOT NULL,
+  heartbeat_at DATETIME NOT NULL,
+  expires_at DATETIME NOT NULL
+);
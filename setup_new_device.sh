@@ -10,8 +10,11 @@ VENV_DIR="$PROJECT_DIR/zk-env"
 ENV_FILE="$PROJECT_DIR/e.env"
 SERVICE_FILE="/etc/systemd/system/zk_run_all.service"
 TIMER_FILE="/etc/systemd/system/zk_run_all.timer"
+SCHEDULER_SERVICE="/etc/systemd/system/zk_scheduler.service"
 BACKUP_SERVICE="/etc/systemd/system/zk_incremental_backup.service"
 BACKUP_TIMER="/etc/systemd/system/zk_incremental_backup.timer"
+PARTITION_SERVICE="/etc/systemd/system/zk_partition_maintenance.service"
+PARTITION_TIMER="/etc/systemd/system/zk_partition_maintenance.timer"
 DB_NAME="zk_attendance"
 
 # Ensure system packages are updated
@@ -48,36 +51,30 @@ ZOHO_CLIENT_ID=$ZOHO_CLIENT_ID
 ZOHO_CLIENT_SECRET=$ZOHO_CLIENT_SECRET
 EOF
 
-# Systemd Service for run_all.py
-echo "🛠️  Creating systemd service for run_all.py..."
-sudo bash -c "cat > $SERVICE_FILE" <<EOF
+# Systemd Service for the adaptive scheduler (replaces the fixed 5-minute run_all.py timer)
+echo "🛠️  Creating systemd service for scheduler.py..."
+sudo bash -c "cat > $SCHEDULER_SERVICE" <<EOF
 [Unit]
-Description=Run ZKTeco Integration Script
+Description=Activity-adaptive ZKTeco to Zoho scheduler
 After=network.target mariadb.service
 
 [Service]
-Type=oneshot
+Type=simple
 WorkingDirectory=$PROJECT_DIR
-ExecStart=/bin/bash -c 'source $VENV_DIR/bin/activate && python3 $PROJECT_DIR/run_all.py'
+ExecStart=/bin/bash -c 'source $VENV_DIR/bin/activate && exec python3 $PROJECT_DIR/scheduler.py'
 EnvironmentFile=$ENV_FILE
+Restart=always
+RestartSec=30
 
 [Install]
 WantedBy=multi-user.target
 EOF
 
-# Timer for every 5 minutes
-sudo bash -c "cat > $TIMER_FILE" <<EOF
-[Unit]
-Description=Run run_all.py every 5 minutes
-
-[Timer]
-OnBootSec=5min
-OnUnitActiveSec=5min
-Persistent=true
-
-[Install]
-WantedBy=timers.target
-EOF
+# Remove the old fixed-interval timer if a previous setup installed it
+if [ -f "$TIMER_FILE" ]; then
+  sudo systemctl disable --now zk_run_all.timer || true
+  sudo rm -f "$TIMER_FILE" "$SERVICE_FILE"
+fi
 
 # Systemd Service for incremental_backup.py
 echo "🛠️  Creating systemd service for backup..."
@@ -109,13 +106,45 @@ Persistent=true
 WantedBy=timers.target
 EOF
 
+# Systemd Service for monthly partition maintenance
+echo "🛠️  Creating systemd service for partition maintenance..."
+sudo bash -c "cat > $PARTITION_SERVICE" <<EOF
+[Unit]
+Description=Create upcoming monthly partitions for attendance tables
+After=network.target mariadb.service
+
+[Service]
+Type=oneshot
+WorkingDirectory=$PROJECT_DIR
+ExecStart=/bin/bash -c 'source $VENV_DIR/bin/activate && python3 $PROJECT_DIR/partition_maintenance.py maintain'
+EnvironmentFile=$ENV_FILE
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
+# Timer for monthly partition maintenance
+sudo bash -c "cat > $PARTITION_TIMER" <<EOF
+[Unit]
+Description=Run partition maintenance monthly
+
+[Timer]
+OnCalendar=monthly
+Persistent=true
+
+[Install]
+WantedBy=timers.target
+EOF
+
 # Reload and enable all services/timers
 echo "🔁 Reloading systemd..."
 sudo systemctl daemon-reexec
 sudo systemctl daemon-reload
-sudo systemctl enable zk_run_all.timer
-sudo systemctl start zk_run_all.timer
+sudo systemctl enable zk_scheduler.service
+sudo systemctl restart zk_scheduler.service
 sudo systemctl enable zk_incremental_backup.timer
 sudo systemctl start zk_incremental_backup.timer
+sudo systemctl enable zk_partition_maintenance.timer
+sudo systemctl start zk_partition_maintenance.timer
 
 echo "✅ Setup complete!"
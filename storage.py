@@ -0,0 +1,179 @@
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, date
+from functools import lru_cache
+from dotenv import load_dotenv
+
+# Storage backend shared by all scripts, selected with DB_BACKEND:
+#
+#   mysql   MariaDB/MySQL through mysql.connector (default)
+#   sqlite  a local SQLite file in WAL mode, for small single-box sites
+#
+# storage.connect() returns a DB-API connection and storage.Error is the
+# exception to catch. The SQLite connection accepts the same %s-style SQL the
+# scripts write for MariaDB and returns DATETIME columns as datetime objects.
+
+# ===== LOAD ENVIRONMENT VARIABLES =====
+load_dotenv("e.env")
+
+DB_BACKEND = os.getenv("DB_BACKEND", "mysql").lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", "zk_attendance.sqlite3")
+SQLITE_SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "schema_sqlite.sql")
+
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST"),
+    "user": os.getenv("DB_USER"),
+    "password": os.getenv("DB_PASS"),
+    "database": os.getenv("DB_NAME")
+}
+
+if DB_BACKEND not in ("mysql", "sqlite"):
+    raise SystemExit(f"Unknown DB_BACKEND '{DB_BACKEND}'; use 'mysql' or 'sqlite'")
+if DB_BACKEND == "sqlite":
+    Error = sqlite3.Error
+else:
+    import mysql.connector
+    Error = mysql.connector.Error
+
+# ===== SQLITE ADAPTER =====
+DATETIME_RE = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(\.\d+)?$")
+DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(sep=" "))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+
+_schema_lock = threading.Lock()
+_schema_ready = set()
+
+@lru_cache(maxsize=256)
+def translate(sql):
+    """MariaDB dialect used by the scripts -> SQLite."""
+    sql = sql.replace("%s", "?")
+    sql = re.sub(r"\bINSERT\s+IGNORE\b", "INSERT OR IGNORE", sql, flags=re.IGNORECASE)
+    return sql
+
+def from_sqlite(value):
+    # SQLite stores DATETIME/DATE as text; hand them back as mysql.connector does
+    if isinstance(value, str):
+        if len(value) >= 19 and DATETIME_RE.match(value):
+            return datetime.fromisoformat(value)
+        if len(value) == 10 and DATE_RE.match(value):
+            return date.fromisoformat(value)
+    return value
+
+def sql_literal(value):
+    if value is None:
+        return "NULL"
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        value = value.isoformat(sep=" ") if isinstance(value, datetime) else value.isoformat()
+    return "'" + str(value).replace("'", "''") + "'"
+
+def sqlite_now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+class SqliteCursor:
+    def __init__(self, conn, dictionary=False):
+        self._cursor = conn.cursor()
+        self._dictionary = dictionary
+        self._last = None
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def statement(self):
+        """Last statement with its parameters inlined, like mysql.connector's cursor.statement."""
+        if self._last is None:
+            return None
+        operation, params = self._last
+        return operation % tuple(sql_literal(p) for p in params) if params else operation
+
+    def execute(self, operation, params=()):
+        params = tuple(params or ())
+        self._last = (operation, params)
+        self._cursor.execute(translate(operation), params)
+        return self
+
+    def executemany(self, operation, seq_params):
+        self._last = (operation, ())
+        self._cursor.executemany(translate(operation), (tuple(p) for p in seq_params))
+        return self
+
+    def _row(self, row):
+        values = tuple(from_sqlite(v) for v in row)
+        if self._dictionary:
+            return dict(zip((d[0] for d in self._cursor.description), values))
+        return values
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        return None if row is None else self._row(row)
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def __iter__(self):
+        for row in self._cursor:
+            yield self._row(row)
+
+    def close(self):
+        self._cursor.close()
+
+class SqliteConnection:
+    def __init__(self, path, autocommit=False):
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None if autocommit else "DEFERRED")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL with synchronous=NORMAL is durable across application crashes and much cheaper on SD cards
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.create_function("NOW", 0, sqlite_now)
+        self._conn.create_function("MOD", 2, lambda a, b: None if a is None or b is None else a % b, deterministic=True)
+        self._open = True
+
+    def cursor(self, dictionary=False, buffered=None):
+        return SqliteCursor(self._conn, dictionary=dictionary)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def is_connected(self):
+        return self._open
+
+    def close(self):
+        if self._open:
+            self._conn.close()
+            self._open = False
+
+def ensure_sqlite_schema(path):
+    """Create the tables on first use of a SQLite file."""
+    with _schema_lock:
+        if path in _schema_ready:
+            return
+        conn = sqlite3.connect(path, timeout=30)
+        with open(SQLITE_SCHEMA_FILE, encoding="utf-8") as f:
+            conn.executescript(f.read())
+        conn.close()
+        _schema_ready.add(path)
+
+# ===== CONNECT =====
+def connect(**options):
+    """Open a connection to the configured backend; options are passed to mysql.connector."""
+    if DB_BACKEND == "sqlite":
+        ensure_sqlite_schema(SQLITE_PATH)
+        return SqliteConnection(SQLITE_PATH, autocommit=options.get("autocommit", False))
+    return mysql.connector.connect(**DB_CONFIG, **options)
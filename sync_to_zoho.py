@@ -1,9 +1,13 @@
 import os
 import requests
-import mysql.connector
+import storage
 from datetime import datetime
 from dotenv import load_dotenv
 import logging
+import leases
+import log_setup
+import profiling
+from punch_batch import PunchBatch
 
 load_dotenv("e.env")
 
@@ -11,23 +15,15 @@ DOMAIN = os.getenv("ZOHO_DOMAIN", "zoho.com")
 CLIENT_ID = os.getenv("ZOHO_CLIENT_ID")
 CLIENT_SECRET = os.getenv("ZOHO_CLIENT_SECRET")
 REFRESH_TOKEN = os.getenv("ZOHO_REFRESH_TOKEN")
+ACCOUNTS_URL = os.getenv("ZOHO_ACCOUNTS_URL", f"https://accounts.{DOMAIN}")
+PEOPLE_URL = os.getenv("ZOHO_PEOPLE_URL", f"https://people.{DOMAIN}")
 
-DB_CONFIG = {
-    "host": os.getenv("DB_HOST"),
-    "user": os.getenv("DB_USER"),
-    "password": os.getenv("DB_PASS"),
-    "database": os.getenv("DB_NAME")
-}
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[logging.FileHandler("zoho_sync.log"), logging.StreamHandler()]
-)
+# Unsynced rows are split by user_id % SYNC_SHARDS; each shard is pushed by one node at a time
+SYNC_SHARDS = int(os.getenv("SYNC_SHARDS", "1"))
 
 def get_access_token():
     res = requests.post(
-        f"https://accounts.{DOMAIN}/oauth/v2/token",
+        f"{ACCOUNTS_URL}/oauth/v2/token",
         data={
             "refresh_token": REFRESH_TOKEN,
             "client_id": CLIENT_ID,
@@ -42,7 +38,7 @@ def get_access_token():
     return token
 
 def fetch_employee_ids(token):
-    url = f"https://people.{DOMAIN}/people/api/forms/employee/getRecords"
+    url = f"{PEOPLE_URL}/people/api/forms/employee/getRecords"
     headers = {"Authorization": f"Zoho-oauthtoken {token}"}
     payload = {"page": 1, "per_page": 200}
     emp_ids = set()
@@ -67,22 +63,22 @@ def fetch_employee_ids(token):
         logging.error(f"❌ Failed to fetch employees: {e}")
         return set()
 
-def fetch_unsynced_logs():
-    conn = mysql.connector.connect(**DB_CONFIG)
-    cursor = conn.cursor(dictionary=True)
+def fetch_unsynced_logs(shard=0, shards=1):
+    conn = storage.connect()
+    cursor = conn.cursor()
     cursor.execute("""
-        SELECT id, name, timestamp, punch_type
+        SELECT id, user_id, timestamp, punch_type, name
         FROM attendance_logs
-        WHERE synced=0
+        WHERE synced=0 AND MOD(user_id, %s) = %s
         ORDER BY timestamp
-    """)
-    rows = cursor.fetchall()
+    """, (shards, shard))
+    rows = PunchBatch.from_rows(cursor)
     cursor.close()
     conn.close()
     return rows
 
 def mark_log_synced(log_id):
-    conn = mysql.connector.connect(**DB_CONFIG)
+    conn = storage.connect()
     cursor = conn.cursor()
     cursor.execute("UPDATE attendance_logs SET synced=1 WHERE id=%s", (log_id,))
     conn.commit()
@@ -90,42 +86,65 @@ def mark_log_synced(log_id):
     conn.close()
 
 def push_attendance(emp_id, check_time, action, token):
-    url = f"https://people.{DOMAIN}/people/api/attendance"
+    url = f"{PEOPLE_URL}/people/api/attendance"
     headers = {"Authorization": f"Zoho-oauthtoken {token}"}
     payload = {"dateFormat": "dd/MM/yyyy HH:mm:ss", "empId": emp_id}
     formatted = check_time.strftime("%d/%m/%Y %H:%M:%S")
     label = "check-in" if action == "in" else "check-out"
     payload["checkIn" if action=="in" else "checkOut"] = formatted
     
-    logging.info(f"📤 Sending {label} for {emp_id} at {formatted}")
+    logging.debug(f"📤 Sending {label} for {emp_id} at {formatted}")
     res = requests.post(url, headers=headers, data=payload, timeout=10)
     if res.status_code == 200:
-        logging.info(f"✅ {label.capitalize()} logged for {emp_id}.")
+        logging.debug(f"✅ {label.capitalize()} logged for {emp_id}.")
         return True
     logging.error(f"❌ Failed {label} for {emp_id}: {res.status_code}, {res.text}")
     return False
 
 def main():
+    log_setup.configure_logging('zoho_sync.log')
     token = get_access_token()
     valid_ids = fetch_employee_ids(token)
     if not valid_ids:
         logging.error("🚫 No employees fetched; aborting sync.")
         return
 
-    logs = fetch_unsynced_logs()
+    for shard in leases.shard_order(SYNC_SHARDS):
+        with leases.Lease(f"sync:{shard}/{SYNC_SHARDS}") as lease:
+            if lease.acquired:
+                sync_shard(shard, valid_ids, token, lease)
+
+def sync_shard(shard, valid_ids, token, lease):
+    logs = fetch_unsynced_logs(shard, SYNC_SHARDS)
     if not logs:
-        logging.info("ℹ️ No unsynced logs found.")
+        logging.info(f"ℹ️ No unsynced logs found in shard {shard}/{SYNC_SHARDS}.")
         return
 
+    pushed = 0
+    failed = 0
+    skipped = {}
     for log in logs:
-        emp = log["name"]
+        if lease.lost:
+            # Another node may own the shard now; it pushes what is left
+            break
+        emp = log.name
         if emp not in valid_ids:
-            logging.warning(f"🚫 Skipped: {emp} not in Zoho.")
+            skipped[emp] = skipped.get(emp, 0) + 1
             continue
 
-        action = "in" if log["punch_type"] == 0 else "out"
-        if push_attendance(emp, log["timestamp"], action, token):
-            mark_log_synced(log["id"])
+        action = "in" if log.punch_type == 0 else "out"
+        if push_attendance(emp, log.timestamp, action, token):
+            mark_log_synced(log.row_id)
+            pushed += 1
+        else:
+            failed += 1
+
+    for emp, count in sorted(skipped.items(), key=lambda item: str(item[0])):
+        logging.warning(f"🚫 Skipped {count} logs: {emp} not in Zoho.")
+    logging.info(
+        f"📤 Shard {shard}/{SYNC_SHARDS}: {pushed} pushed, {failed} failed, {sum(skipped.values())} skipped",
+        extra={"shard": shard, "pushed": pushed, "failed": failed, "skipped": sum(skipped.values())}
+    )
 
 if __name__ == "__main__":
-    main()
+    profiling.run_main(main, "sync_to_zoho")
@@ -1,9 +1,15 @@
 import os
+import json
+import hashlib
 import requests
-import mysql.connector
+import storage
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import logging
+import daily_summary
+import leases
+import log_setup
+import profiling
 
 # ===== LOAD ENVIRONMENT VARIABLES =====
 load_dotenv("e.env")
@@ -13,30 +19,14 @@ DOMAIN = os.getenv("ZOHO_DOMAIN", "zoho.com")
 CLIENT_ID = os.getenv("ZOHO_CLIENT_ID")
 CLIENT_SECRET = os.getenv("ZOHO_CLIENT_SECRET")
 REFRESH_TOKEN = os.getenv("ZOHO_REFRESH_TOKEN")
-
-DB_CONFIG = {
-    "host": os.getenv("DB_HOST"),
-    "user": os.getenv("DB_USER"),
-    "password": os.getenv("DB_PASS"),
-    "database": os.getenv("DB_NAME")
-}
-
-# ===== LOGGING SETUP =====
-def configure_logging():
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('zoho_logs.log'),
-            logging.StreamHandler()
-        ]
-    )
+ACCOUNTS_URL = os.getenv("ZOHO_ACCOUNTS_URL", f"https://accounts.{DOMAIN}")
+PEOPLE_URL = os.getenv("ZOHO_PEOPLE_URL", f"https://people.{DOMAIN}")
 
 # ===== GET ACCESS TOKEN =====
 def get_access_token():
     try:
         response = requests.post(
-            f"https://accounts.{DOMAIN}/oauth/v2/token",
+            f"{ACCOUNTS_URL}/oauth/v2/token",
             data={
                 "refresh_token": REFRESH_TOKEN,
                 "client_id": CLIENT_ID,
@@ -56,55 +46,22 @@ def get_access_token():
 # ===== GET LAST SYNCED TIMESTAMP =====
 def get_last_synced_timestamp():
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = storage.connect()
         cursor = conn.cursor()
         cursor.execute("SELECT MAX(timestamp) FROM attendance_logs WHERE source = 'zoho'")
         result = cursor.fetchone()[0]
         cursor.close()
         conn.close()
-        return result or (datetime.now() - timedelta(days=30))
+        # One day earlier, so a night shift closed after midnight is fetched together with the day it started
+        return result - timedelta(days=1) if result else datetime.now() - timedelta(days=30)
     except Exception as e:
         logging.error(f"❌ Failed to get last synced timestamp: {e}")
         return datetime.now() - timedelta(days=30)
 
-# ===== CHECK IF LOG EXISTS IN attendance_logs =====
-def log_exists_in_attendance(user_id, timestamp, punch_type):
-    try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT COUNT(*) FROM attendance_logs WHERE user_id = %s AND timestamp = %s AND punch_type = %s",
-            (user_id, timestamp, punch_type)
-        )
-        count = cursor.fetchone()[0]
-        cursor.close()
-        conn.close()
-        return count > 0
-    except Exception as e:
-        logging.error(f"❌ Error checking attendance_logs: {e}")
-        return False
-
-# ===== CHECK IF LOG EXISTS IN raw_zoho_logs =====
-def log_exists_in_raw_zoho(user_id, timestamp, punch_type):
-    try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT COUNT(*) FROM raw_zoho_logs WHERE user_id = %s AND timestamp = %s AND punch_type = %s",
-            (user_id, timestamp, punch_type)
-        )
-        count = cursor.fetchone()[0]
-        cursor.close()
-        conn.close()
-        return count > 0
-    except Exception as e:
-        logging.error(f"❌ Error checking raw_zoho_logs: {e}")
-        return False
-
 # ===== GET DEVICE USER ID MAPPING =====
 def get_device_user_id(zoho_emp_id):
     try:
-        conn = mysql.connector.connect(**DB_CONFIG)
+        conn = storage.connect()
         cursor = conn.cursor()
         cursor.execute("SELECT zk_user_id FROM user_mapping WHERE zoho_emp_id = %s", (zoho_emp_id,))
         result = cursor.fetchone()
@@ -115,48 +72,108 @@ def get_device_user_id(zoho_emp_id):
         logging.error(f"❌ Error fetching user mapping for Zoho ID {zoho_emp_id}: {e}")
         return 0
 
-# ===== INSERT LOG INTO DATABASE =====
-def insert_log_to_db(user_id, name, timestamp, status):
-    punch_type = 0 if status == "Check-In" else 1
-    conn = None
+# ===== DAY DIGESTS =====
+def day_digest(att_entries):
+    """Content hash of one day's attEntries, independent of key order."""
+    canonical = json.dumps(att_entries, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def load_day_digests(cursor, emp_ids):
+    digests = {}
+    emp_ids = list(emp_ids)
+    for i in range(0, len(emp_ids), 500):
+        chunk = emp_ids[i:i + 500]
+        placeholders = ", ".join(["%s"] * len(chunk))
+        cursor.execute(f"SELECT emp_id, day_key, digest FROM zoho_day_digests WHERE emp_id IN ({placeholders})", chunk)
+        for emp_id, day_key, digest in cursor.fetchall():
+            digests[(emp_id, day_key)] = digest
+    return digests
+
+def day_punches(att_entries):
+    punches = set()
+    for att in att_entries:
+        if "checkInTime" in att:
+            punches.add((datetime.strptime(att["checkInTime"], "%d-%m-%Y %H:%M:%S"), 0))
+        if "checkOutTime" in att:
+            punches.add((datetime.strptime(att["checkOutTime"], "%d-%m-%Y %H:%M:%S"), 1))
+    return punches
+
+def day_date(day_key):
     try:
-        # Check duplicates in both tables
-        exists_in_attendance = log_exists_in_attendance(user_id, timestamp, punch_type)
-        exists_in_raw = log_exists_in_raw_zoho(user_id, timestamp, punch_type)
+        return datetime.strptime(day_key, "%d-%m-%Y").date()
+    except ValueError:
+        return None
 
-        if exists_in_attendance or exists_in_raw:
-            # Skip silently
-            return False  # no insertion
+def day_range(day_key, punches):
+    """Time range a day's Zoho rows can fall in; check-outs after midnight stay with their day."""
+    bounds = [ts for ts, _ in punches]
+    day = day_date(day_key)
+    if day is not None:
+        day_start = datetime.combine(day, datetime.min.time())
+        bounds += [day_start, day_start + timedelta(days=1)]
+    if not bounds:
+        return None
+    return min(bounds), max(bounds) + timedelta(seconds=1)
 
-        conn = mysql.connector.connect(**DB_CONFIG)
-        cursor = conn.cursor()
+# ===== APPLY ONE CHANGED DAY =====
+def ingest_day(cursor, user_id, name, day_key, punches, keep, covered):
+    """Bring the Zoho rows of one day in line with punches.
+
+    Rows of this employee in the day's range that Zoho no longer returns
+    (and that no other returned day still holds) are deleted. covered is the
+    set of dates Zoho returned; a row is only deleted when its own date and
+    the day before were both returned, since a check-out after midnight
+    belongs to the previous day's entry.
+    Returns (inserted, deleted) lists of timestamps.
+    """
+    span = day_range(day_key, punches)
+    if span is None:
+        return [], []
+    cursor.execute(
+        "SELECT timestamp, punch_type FROM raw_zoho_logs WHERE user_id = %s AND name = %s AND timestamp >= %s AND timestamp < %s",
+        (user_id, name, *span)
+    )
+    in_raw = set(cursor.fetchall())
+    cursor.execute(
+        "SELECT timestamp, punch_type FROM attendance_logs WHERE user_id = %s AND timestamp >= %s AND timestamp < %s",
+        (user_id, *span)
+    )
+    in_attendance = set(cursor.fetchall())
+
+    new = sorted(p for p in punches if p not in in_raw and p not in in_attendance)
+    removed = sorted(
+        (ts, punch_type) for ts, punch_type in in_raw
+        if (ts, punch_type) not in keep and ts.date() in covered and ts.date() - timedelta(days=1) in covered
+    )
 
-        # Insert into attendance_logs
-        cursor.execute("""
+    if new:
+        cursor.executemany("""
             INSERT INTO attendance_logs (user_id, name, timestamp, punch_type, synced, source)
             VALUES (%s, %s, %s, %s, 1, 'zoho')
-        """, (user_id, name, timestamp, punch_type))
-
-        # Insert into raw_zoho_logs
-        cursor.execute("""
+        """, [(user_id, name, ts, punch_type) for ts, punch_type in new])
+        cursor.executemany("""
             INSERT INTO raw_zoho_logs (user_id, name, timestamp, punch_type, source)
             VALUES (%s, %s, %s, %s, 'zoho')
-        """, (user_id, name, timestamp, punch_type))
+        """, [(user_id, name, ts, punch_type) for ts, punch_type in new])
+    if removed:
+        cursor.executemany(
+            "DELETE FROM attendance_logs WHERE user_id = %s AND timestamp = %s AND punch_type = %s AND source = 'zoho'",
+            [(user_id, ts, punch_type) for ts, punch_type in removed]
+        )
+        cursor.executemany(
+            "DELETE FROM raw_zoho_logs WHERE user_id = %s AND name = %s AND timestamp = %s AND punch_type = %s",
+            [(user_id, name, ts, punch_type) for ts, punch_type in removed]
+        )
 
-        conn.commit()
-        logging.info(f"🟢 Inserted: {name} ({user_id}) - {status} at {timestamp}")
-        return True  # inserted
-    except Exception as e:
-        logging.error(f"❌ Insert error for {name} at {timestamp}: {e}")
-        return False
-    finally:
-        if conn is not None and conn.is_connected():
-            cursor.close()
-            conn.close()
+    for ts, punch_type in new:
+        logging.debug(f"🟢 Inserted: {name} ({user_id}) - {'Check-In' if punch_type == 0 else 'Check-Out'} at {ts}")
+    for ts, punch_type in removed:
+        logging.debug(f"🗑️ Removed (deleted in Zoho): {name} ({user_id}) - {'Check-In' if punch_type == 0 else 'Check-Out'} at {ts}")
+    return [ts for ts, _ in new], [ts for ts, _ in removed]
 
 # ===== FETCH ZOHO ATTENDANCE =====
 def fetch_zoho_attendance(token, from_date):
-    url = f"https://people.{DOMAIN}/people/api/attendance/fetchLatestAttEntries"
+    url = f"{PEOPLE_URL}/people/api/attendance/fetchLatestAttEntries"
     headers = {"Authorization": f"Zoho-oauthtoken {token}"}
     params = {
         "duration": "200",
@@ -167,6 +184,11 @@ def fetch_zoho_attendance(token, from_date):
     logging.info(f"📡 Fetching Zoho logs from: {from_date.strftime('%d-%m-%Y')}...")
 
     inserted_count = 0
+    deleted_count = 0
+    changed_days = 0
+    unchanged_days = 0
+    touched = []
+    conn = None
 
     try:
         res = requests.get(url, headers=headers, params=params, timeout=20)
@@ -177,39 +199,75 @@ def fetch_zoho_attendance(token, from_date):
             logging.error(data)
             return
 
-        for emp in data["response"].get("result", []):
+        employees = data["response"].get("result", [])
+        conn = storage.connect()
+        cursor = conn.cursor()
+        digests = load_day_digests(cursor, {emp.get("employeeId") for emp in employees})
+
+        for emp in employees:
             emp_id = emp.get("employeeId")
             name = emp_id  # Or replace with actual name if available
-            user_id = get_device_user_id(emp_id)
 
+            days = {}
             for entry in emp.get("entries", []):
-                for day_entry in entry.values():
-                    for att in day_entry.get("attEntries", []):
-                        if "checkInTime" in att:
-                            timestamp = datetime.strptime(att["checkInTime"], "%d-%m-%Y %H:%M:%S")
-                            if insert_log_to_db(user_id, name, timestamp, "Check-In"):
-                                inserted_count += 1
-
-                        if "checkOutTime" in att:
-                            timestamp = datetime.strptime(att["checkOutTime"], "%d-%m-%Y %H:%M:%S")
-                            if insert_log_to_db(user_id, name, timestamp, "Check-Out"):
-                                inserted_count += 1
+                for day_key, day_entry in entry.items():
+                    att_entries = day_entry.get("attEntries", [])
+                    days[day_key] = (day_digest(att_entries), day_punches(att_entries))
+
+            changed = {k: v for k, v in days.items() if digests.get((emp_id, k)) != v[0]}
+            unchanged_days += len(days) - len(changed)
+            if not changed:
+                continue
 
+            user_id = get_device_user_id(emp_id)
+            # Punches Zoho still returns on any day; an overnight check-out is never deleted from its neighbour
+            keep = set().union(*(punches for _, punches in days.values()))
+            covered = {day_date(k) for k in days} - {None}
+            for day_key, (digest, punches) in sorted(changed.items()):
+                try:
+                    inserted, deleted = ingest_day(cursor, user_id, name, day_key, punches, keep, covered)
+                    cursor.execute(
+                        "REPLACE INTO zoho_day_digests (emp_id, day_key, digest) VALUES (%s, %s, %s)",
+                        (emp_id, day_key, digest)
+                    )
+                    conn.commit()
+                except storage.Error as e:
+                    # Digest not stored, so the day is retried on the next run
+                    conn.rollback()
+                    logging.error(f"❌ Error applying {name} {day_key}: {e}")
+                    continue
+                changed_days += 1
+                inserted_count += len(inserted)
+                deleted_count += len(deleted)
+                touched.extend((user_id, ts) for ts in inserted + deleted)
+
+        cursor.close()
+        daily_summary.refresh_daily_summary(daily_summary.day_keys(touched))
+
+        logging.info(f"📅 {changed_days} changed days processed, {unchanged_days} unchanged days skipped")
         if inserted_count == 0:
             logging.info("🆕 0 new records found")
         else:
             logging.info(f"🆕 {inserted_count} new records found")
+        if deleted_count:
+            logging.info(f"🗑️ {deleted_count} records removed (deleted in Zoho)")
 
     except Exception as e:
         logging.error(f"❌ Error fetching Zoho attendance: {e}")
+    finally:
+        if conn is not None and conn.is_connected():
+            conn.close()
 
 # ===== MAIN =====
 def main():
-    configure_logging()
-    token = get_access_token()
-    last_sync = get_last_synced_timestamp()
-    fetch_zoho_attendance(token, last_sync)
+    log_setup.configure_logging('zoho_logs.log')
+    with leases.Lease("zoho-import") as lease:
+        if not lease.acquired:
+            return
+        token = get_access_token()
+        last_sync = get_last_synced_timestamp()
+        fetch_zoho_attendance(token, last_sync)
     logging.info("✅ Zoho sync to database complete.")
 
 if __name__ == "__main__":
-    main()
+    profiling.run_main(main, "zoholog_to_db")